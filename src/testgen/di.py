@@ -1,7 +1,16 @@
 from dependency_injector import containers, providers
 
 from testgen.llm import ChatModel
+from testgen.service.blobs import BlobStore
+from testgen.service.compaction import HistoryCompactor
+from testgen.service.existing_tests import ExistingTestIndex
+from testgen.service.git import GitDiff
+from testgen.service.http import HttpClientPool
+from testgen.service.index import SymbolIndex
+from testgen.service.limiter import ModelLimiter
 from testgen.service.python import CodeExtractor
+from testgen.service.storage import create_storage
+from testgen.service.tracer import ExecutionTracer
 from testgen.settings import Settings
 
 
@@ -10,8 +19,23 @@ class DIContainer(containers.DeclarativeContainer):
         Settings
     )
 
+    blob_store = providers.Singleton(
+        BlobStore
+    )
+
+    http_pool = providers.Singleton(
+        HttpClientPool,
+        settings
+    )
+
     model = providers.Singleton(
         ChatModel,
+        settings,
+        http_pool
+    )
+
+    model_limiter = providers.Singleton(
+        ModelLimiter,
         settings
     )
 
@@ -19,3 +43,36 @@ class DIContainer(containers.DeclarativeContainer):
         CodeExtractor,
         settings
     )
+
+    git_diff = providers.Singleton(
+        GitDiff,
+        settings
+    )
+
+    symbol_index = providers.Singleton(
+        SymbolIndex,
+        settings,
+        code_extractor
+    )
+
+    existing_tests = providers.Singleton(
+        ExistingTestIndex,
+        settings,
+        code_extractor
+    )
+
+    history_compactor = providers.Singleton(
+        HistoryCompactor,
+        settings,
+        model
+    )
+
+    storage = providers.Singleton(
+        create_storage,
+        settings
+    )
+
+    tracer = providers.Singleton(
+        ExecutionTracer,
+        settings
+    )
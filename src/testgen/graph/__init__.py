@@ -1,15 +1,15 @@
 from testgen.graph.base import BaseGraph
+from testgen.graph.estimate import EstimateGraph
 from testgen.graph.generator import GeneratorGraph
 from testgen.graph.main import MainGraph
 from testgen.graph.processor import ProcessorGraph
 from testgen.graph.scanner import ScannerGraph
-from testgen.graph.writer import WriterGraph
 
 __all__ = [
     'BaseGraph',
+    'EstimateGraph',
     'GeneratorGraph',
     'MainGraph',
     'ProcessorGraph',
     'ScannerGraph',
-    'WriterGraph'
 ]
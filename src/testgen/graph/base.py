@@ -6,6 +6,7 @@ from langgraph.graph.state import CompiledStateGraph
 
 from testgen.di import DIContainer
 from testgen.llm import ChatModel
+from testgen.service.tracer import ExecutionTracer
 from testgen.settings import Settings
 
 
@@ -16,9 +17,11 @@ class BaseGraph(ABC):
             self,
             settings: Settings = Provide[DIContainer.settings],
             model: ChatModel = Provide[DIContainer.model],
+            tracer: ExecutionTracer = Provide[DIContainer.tracer],
     ):
         self.settings = settings
         self.model = model
+        self.tracer = tracer
 
         # Check if the child class has defined 'input_schema'
         if not hasattr(self, 'input_schema'):
@@ -38,5 +41,8 @@ class BaseGraph(ABC):
 
     def run(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
         graph = self.build()
-        response = graph.invoke(input_data)
+        config = {'max_concurrency': self.settings.concurrency}
+        if self.tracer.enabled:
+            config['callbacks'] = [self.tracer]
+        response = graph.invoke(input_data, config)
         return response
@@ -0,0 +1,251 @@
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.messages import BaseMessage
+from langgraph.graph import StateGraph, START, END
+from langgraph.graph.state import CompiledStateGraph
+from typing_extensions import TypedDict
+
+from testgen.di import DIContainer
+from testgen.graph.base import BaseGraph
+from testgen.graph.generator import GeneratorGraph, GeneratorRun
+from testgen.graph.scanner import ScannerGraph
+from testgen.graph.state import KeyedMessages, RootState
+from testgen.models import FunctionMessage
+from testgen.pipeline.explain import ExplainPipeline
+from testgen.pipeline.fixture import FixturePipeline
+from testgen.pipeline.generate import GeneratePipeline
+from testgen.pipeline.merge import MergePipeline
+from testgen.pipeline.method_tests import MethodTestsPipeline
+from testgen.pipeline.plan import PlanPipeline
+from testgen.pipeline.single_shot import SingleShotPipeline
+
+logger = logging.getLogger(__name__)
+
+
+class InputEstimateState(TypedDict):
+    source_folder: str
+    target_folder: str
+    changes: Optional[Dict[str, List[Tuple[int, int]]]]
+    roots: Optional[List[RootState]]
+    top: Optional[int]
+
+
+class OutputEstimateState(TypedDict):
+    estimate: Dict[str, Any]
+
+
+class EstimateState(InputEstimateState, OutputEstimateState):
+    files: KeyedMessages
+    functions: KeyedMessages
+    run: GeneratorRun
+
+
+class EstimateGraph(BaseGraph):
+    """Dry run: scan and describe source files, render prompts without sending them and estimate the cost"""
+    node_name = 'Estimate'
+    input_schema = InputEstimateState
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.generator = GeneratorGraph()
+        self.explain_pipeline = ExplainPipeline()
+        self.plan_pipeline = PlanPipeline()
+        self.generate_pipeline = GeneratePipeline()
+        self.single_shot_pipeline = SingleShotPipeline()
+        self.merge_pipeline = MergePipeline()
+        self.fixture_pipeline = FixturePipeline()
+        self.method_tests_pipeline = MethodTestsPipeline()
+
+    def count(self, messages: List[BaseMessage]) -> int:
+        return self.model.count_tokens(messages)
+
+    def call(self, pipeline: str, input_tokens: int, output_tokens: int) -> Dict[str, Any]:
+        """Estimate a single model call"""
+        model_settings = self.settings.model
+        estimate = self.settings.estimate
+        return {
+            'pipeline': pipeline,
+            'input_tokens': input_tokens,
+            'output_tokens': output_tokens,
+            'cost': (input_tokens * model_settings.input_price + output_tokens * model_settings.output_price) / 1e6,
+            'duration': estimate.request_latency + output_tokens / estimate.tokens_per_second,
+        }
+
+    def estimate_function(self, function: FunctionMessage) -> List[Dict[str, Any]]:
+        """Render prompts of the function pipelines and estimate their calls"""
+        output_tokens = self.settings.estimate.output_tokens
+        if function.route == 'class':
+            fixture_tokens = self.count(self.fixture_pipeline.get_input().invoke(function).to_messages())
+            size = self.settings.class_suites.methods_per_call
+            calls = [self.call('fixture', fixture_tokens, output_tokens['fixture'])]
+            for index in range(0, len(function.methods), size):
+                prompt = self.method_tests_pipeline.get_input().invoke({
+                    'function': function, 'fixture': '', 'methods': function.methods[index:index + size],
+                }).to_messages()
+                # the generated fixture is part of the prompt
+                calls.append(self.call('method_tests', self.count(prompt) + output_tokens['fixture'],
+                                       output_tokens['method_tests']))
+            return calls
+        if function.route == 'simple':
+            prompt = self.single_shot_pipeline.get_input().invoke(function).to_messages()
+            return [self.call('single_shot', self.count(prompt), output_tokens['single_shot'])]
+
+        explain_prompt = self.explain_pipeline.get_input().invoke(function).to_messages()
+        explain_tokens = self.count(explain_prompt)
+        # follow-up prompts are rendered without history, which is estimated from the previous calls
+        plan_tokens = self.count(self.plan_pipeline.get_input().invoke({'messages': []}).to_messages())
+        generate_tokens = self.count(self.generate_pipeline.get_input().invoke({'messages': []}).to_messages())
+        plan_input = explain_tokens + output_tokens['explain'] + plan_tokens
+        if self.settings.compaction.enabled:
+            history_tokens = min(self.settings.compaction.max_tokens, plan_input + output_tokens['plan'])
+        else:
+            history_tokens = plan_input + output_tokens['plan']
+        return [
+            self.call('explain', explain_tokens, output_tokens['explain']),
+            self.call('plan', plan_input, output_tokens['plan']),
+            self.call('generate', history_tokens + generate_tokens, output_tokens['generate']),
+        ]
+
+    def estimate(self, state: EstimateState) -> OutputEstimateState:
+        all_functions = list(state.get('functions', {}).values())
+        merge_tokens = self.count(self.merge_pipeline.get_input().invoke([]).to_messages())
+
+        calls = []
+        files: Dict[str, Dict[str, Any]] = {}
+        function_estimates = []
+        for function in all_functions:
+            file = files.setdefault(function.file_message.key, {'calls': [], 'functions': 0, 'longest_chain': 0.0})
+            # duplicates do not call the model, but their tests are merged into their files
+            file['functions'] += 1
+            if function.duplicate_of:
+                continue
+            function_calls = self.estimate_function(function)
+            function_estimate = self.summarize(function.id, function_calls)
+            function_estimates.append(function_estimate)
+            file['calls'].extend(function_calls)
+            file['longest_chain'] = max(file['longest_chain'], function_estimate['duration'])
+            calls.extend(function_calls)
+
+        file_estimates = []
+        critical_path = 0.0
+        for file_id, file in files.items():
+            snippets = [self.settings.estimate.output_tokens['generate']] * file['functions']
+            merge_calls, merge_duration = self.estimate_merge(snippets, merge_tokens)
+            file['calls'].extend(merge_calls)
+            calls.extend(merge_calls)
+            # a file is ready after its slowest function and the merge
+            critical_path = max(critical_path, file['longest_chain'] + merge_duration)
+            file_estimates.append(self.summarize(file_id, file['calls']))
+
+        total = self.summarize('total', calls)
+        total['duration'] = self.wall_clock(calls, critical_path)
+        top = state.get('top') or 10
+        return {
+            'estimate': {
+                'model': self.settings.model.params.get('model', self.settings.model.type.name),
+                'functions': len(all_functions),
+                'processed_functions': len(function_estimates),
+                'total': total,
+                'files': sorted(file_estimates, key=lambda e: e['cost'], reverse=True),
+                'top_functions': sorted(function_estimates, key=lambda e: e['cost'], reverse=True)[:top],
+            }
+        }
+
+    def estimate_merge(self, snippets: List[int], prompt_tokens: int) -> Tuple[List[Dict[str, Any]], float]:
+        """Estimate calls and duration of the hierarchical merge of test snippets of the given sizes"""
+        calls = []
+        duration = 0.0
+        while len(snippets) > 1:
+            groups = MergePipeline.group(snippets, self.settings.merge.max_input_tokens)
+            level = []
+            for group in groups:
+                tokens = sum(snippets[index] for index in group)
+                level.append(self.call('merge', prompt_tokens + tokens, tokens))
+            calls.extend(level)
+            # groups of the same level are merged in parallel
+            duration += max(c['duration'] for c in level)
+            snippets = [c['output_tokens'] for c in level]
+        return calls, duration
+
+    @staticmethod
+    def summarize(item_id: str, calls: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return {
+            'id': item_id,
+            'calls': len(calls),
+            'input_tokens': sum(c['input_tokens'] for c in calls),
+            'output_tokens': sum(c['output_tokens'] for c in calls),
+            'cost': sum(c['cost'] for c in calls),
+            'duration': sum(c['duration'] for c in calls),
+        }
+
+    def wall_clock(self, calls: List[Dict[str, Any]], critical_path: float) -> float:
+        """Estimate run duration limited by concurrency, rate limits and the longest file"""
+        rate_limit = self.settings.rate_limit
+        bounds = [critical_path, sum(c['duration'] for c in calls) / max(self.settings.concurrency, 1)]
+        if rate_limit.requests_per_minute:
+            bounds.append(len(calls) / rate_limit.requests_per_minute * 60)
+        if rate_limit.tokens_per_minute:
+            tokens = sum(c['input_tokens'] + c['output_tokens'] for c in calls)
+            bounds.append(tokens / rate_limit.tokens_per_minute * 60)
+        return max(bounds)
+
+    def build(self) -> CompiledStateGraph:
+        graph_builder = StateGraph(
+            input=InputEstimateState,
+            state_schema=EstimateState,
+            output=OutputEstimateState
+        )
+
+        # define nodes
+        scanner = ScannerGraph()
+        graph_builder.add_node(scanner.name, scanner.build(), input=scanner.input_schema)
+        graph_builder.add_node('Describe', self.generator.describe)
+        graph_builder.add_node('Estimate', self.estimate)
+
+        # define edges
+        graph_builder.add_edge(START, scanner.name)
+        graph_builder.add_edge(scanner.name, 'Describe')
+        graph_builder.add_edge('Describe', 'Estimate')
+        graph_builder.add_edge('Estimate', END)
+
+        graph = graph_builder.compile()
+        return graph
+
+
+def format_estimate(estimate: Dict[str, Any]) -> str:
+    """Format dry-run estimate as a human-readable report"""
+
+    def row(item: Dict[str, Any]) -> str:
+        return (f"{item['calls']:>6} {item['input_tokens']:>12,} {item['output_tokens']:>12,} "
+                f"{item['cost']:>10.4f} {item['duration']:>10.1f}  {item['id']}")
+
+    header = f"{'calls':>6} {'input tok':>12} {'output tok':>12} {'cost, $':>10} {'time, s':>10}  item"
+    lines = [
+        f"Model: {estimate['model']}",
+        f"Functions: {estimate['functions']} ({estimate['processed_functions']} sent to the model)",
+        '',
+        header,
+        row(estimate['total']),
+        '',
+        'Per file:',
+        header,
+        *[row(item) for item in estimate['files']],
+        '',
+        'Most expensive functions:',
+        header,
+        *[row(item) for item in estimate['top_functions']],
+    ]
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    di = DIContainer()
+    di.wire(packages=[
+        'testgen',
+        'testgen.graph',
+        'testgen.tools',
+    ])
+    g = EstimateGraph()
+    response = g.run({'source_folder': 'src', 'target_folder': 'test'})
+    print(format_estimate(response['estimate']))
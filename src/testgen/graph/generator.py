@@ -1,11 +1,14 @@
 import logging
+from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Annotated
+from itertools import chain, zip_longest
+from typing import Any, List, Dict, Optional, Tuple
 
 from dependency_injector.wiring import Provide, inject
+from langchain_core.messages import HumanMessage
 from langchain_core.messages.base import BaseMessage
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph, START, END
-from langgraph.graph.message import add_messages
 from langgraph.graph.state import CompiledStateGraph
 from langgraph.types import Send
 from typing_extensions import TypedDict
@@ -13,24 +16,52 @@ from typing_extensions import TypedDict
 from testgen.di import DIContainer
 from testgen.graph.base import BaseGraph
 from testgen.graph.processor import ProcessorGraph
-from testgen.models import FunctionMessage, TestFileMessage
+from testgen.graph.state import KeyedMessages, KeyedPaths, RootState, get_roots
+from testgen.models import FileMessage, FileRef, FunctionDescription, FunctionMessage, TestFileMessage
 from testgen.pipeline.merge import MergePipeline
+from testgen.service.adapt import adapt_test
+from testgen.service.blobs import BlobStore
+from testgen.service.existing_tests import ExistingTestIndex
+from testgen.service.index import SymbolIndex, module_name
 from testgen.service.python import CodeExtractor
+from testgen.service.storage import join_path
+from testgen.service.tracker import FileTracker
+from testgen.tools import list_files, read_file, write_files
 
 logger = logging.getLogger(__name__)
 
 
 class InputGeneratorState(TypedDict):
-    files: Annotated[List[BaseMessage], add_messages]
+    files: KeyedMessages
+    source_folder: str
+    target_folder: str
+    changes: Optional[Dict[str, List[Tuple[int, int]]]]
+    roots: Optional[List[RootState]]
 
 
 class OutputGeneratorState(TypedDict):
-    files: Annotated[List[BaseMessage], add_messages]
-    tests: Annotated[List[BaseMessage], add_messages]
+    files: KeyedMessages
+    tests: KeyedPaths
+    failures: KeyedMessages
+    summary: Dict[str, Dict[str, Any]]
+
+
+@dataclass
+class GeneratorRun:
+    """Per-run state shared by the parallel Process branches, so runs of the same graph do not interfere"""
+    tracker: FileTracker
+    roots: Dict[str, RootState]
+    summary: Dict[str, Dict[str, Any]]
 
 
 class GeneratorState(InputGeneratorState, OutputGeneratorState):
-    functions: Annotated[List[BaseMessage], add_messages]
+    functions: KeyedMessages
+    run: GeneratorRun
+
+
+class ProcessState(TypedDict):
+    function: BaseMessage
+    run: GeneratorRun
 
 
 class GeneratorGraph(BaseGraph):
@@ -41,56 +72,323 @@ class GeneratorGraph(BaseGraph):
     def __init__(
             self,
             code_extractor: CodeExtractor = Provide[DIContainer.code_extractor],
+            symbol_index: SymbolIndex = Provide[DIContainer.symbol_index],
+            blob_store: BlobStore = Provide[DIContainer.blob_store],
+            existing_tests: ExistingTestIndex = Provide[DIContainer.existing_tests],
             *args,
             **kwargs
     ):
         super().__init__(*args, **kwargs)
         self.code_extractor = code_extractor
+        self.symbol_index = symbol_index
+        self.blob_store = blob_store
+        self.existing_tests = existing_tests
         self.merge_pipeline = MergePipeline().get_pipeline()
+        self.processor = ProcessorGraph().build()
 
     def describe(self, state: InputGeneratorState) -> GeneratorState:
-        """Describe python file and extract class names, methods and functions"""
-        files = list(state['files'])
+        """Describe python files of every root and extract class names, methods and functions"""
+        roots = {root['source_folder']: root for root in get_roots(state)}
+        files_by_root: Dict[str, List[FileMessage]] = {source_folder: [] for source_folder in roots}
+        for file in state['files'].values():
+            # files of a single root scan may not know their root
+            if file.root not in files_by_root:
+                file.root = next(iter(roots))
+            files_by_root[file.root].append(file)
+        summary = {}
+        functions_by_root = []
+        for source_folder, files in files_by_root.items():
+            root_functions, summary[source_folder] = self.describe_root(roots[source_folder], files)
+            functions_by_root.append(root_functions)
+        # interleave roots, so the shared concurrency pool serves all of them fairly
+        functions = [f for f in chain.from_iterable(zip_longest(*functions_by_root)) if f is not None]
+        if self.settings.deduplicate:
+            self.deduplicate(functions)
+        self.assign_routes(functions)
+        logger.debug('Blob store: %d blobs, %d characters, %d interned duplicates',
+                      len(self.blob_store), self.blob_store.size, self.blob_store.hits)
+        return {
+            'functions': {function.id: function for function in functions},
+            'run': GeneratorRun(tracker=FileTracker(functions), roots=roots, summary=summary),
+        }
+
+    def describe_root(
+            self,
+            root: RootState,
+            files: List[FileMessage]
+    ) -> Tuple[List[FunctionMessage], Dict[str, Any]]:
+        """
+        Extract functions of files of a single source folder to process.
+        :return: Functions to process and the summary of the root.
+        """
+        source_folder = root['source_folder']
+        changes = root.get('changes')
+        # symbols are indexed per root, module names of different roots may clash
+        if self.settings.cross_module_context:
+            self.symbol_index.build(files, loader=lambda path: read_file(path, folder=source_folder))
+        # changed functions are regenerated even if tested, their existing tests may be stale
+        skip_tested = self.settings.skip_tested and changes is None
+        if skip_tested:
+            self.existing_tests.build(self.list_tests(root.get('target_folder')))
         functions = []
+        skipped = 0
         for file in files:
             file.functions = self.code_extractor.extract_functions(file.content)
-            for func in file.functions:
-                func_message = FunctionMessage(
+            selected = [
+                func for func in file.functions
+                if changes is None or self.is_changed(func, changes.get(str(file.id), []))
+            ]
+            if skip_tested:
+                tested = [func for func in selected if self.existing_tests.is_tested(str(file.id), func)]
+                skipped += len(tested)
+                selected = [func for func in selected if func not in tested]
+            if not selected:
+                continue
+            # functions refer to the file content by hash instead of embedding the whole file message
+            file_ref = FileRef(id=str(file.id), content_hash=self.blob_store.put(file.content), root=source_folder)
+            classes = []
+            if self.settings.class_suites.enabled:
+                classes = self.group_classes(file, selected)
+                grouped = {method.start_line for _, methods in classes for method in methods}
+                selected = [func for func in selected if func.start_line not in grouped]
+            for func, methods in classes + [(func, None) for func in selected]:
+                functions.append(FunctionMessage(
+                    id=f'{file_ref.key}::{func.name}:{func.start_line}',
                     name=func.name,
                     content=func.body,
-                    file_message=file,
-                )
-                functions.append(func_message)
-        return {
-            'functions': functions,
-            'files': state['files'],
-            'tests': [],
+                    file_message=file_ref,
+                    description=func,
+                    context=self.symbol_index.context_for(file, func) if self.settings.cross_module_context else None,
+                    route='class' if methods else None,
+                    methods=methods,
+                ))
+        if skipped:
+            logger.info('Skipped %d functions of %s already exercised by existing tests', skipped, source_folder)
+        return functions, {
+            'source_folder': source_folder,
+            'target_folder': root.get('target_folder'),
+            'files': len(files),
+            'functions': len(functions),
+            'skipped': skipped,
         }
 
-    def merge(self, state: GeneratorState) -> OutputGeneratorState:
-        files = state['files']
-        functions = state['functions']
-        tests = []
-        for file in files:
-            file_functions = list(filter(lambda x: x.file_message.id == file.id, functions))
-            if len(file_functions) > 1:
-                generated_code = self.merge_pipeline.invoke(file_functions)
+    @staticmethod
+    def list_tests(target_folder: Optional[str]) -> List[BaseMessage]:
+        """List existing test files of the target folder"""
+        try:
+            return list_files(folder=target_folder)
+        except FileNotFoundError:
+            return []
+
+    def group_classes(
+            self,
+            file: FileMessage,
+            functions: List[FunctionDescription]
+    ) -> List[Tuple[FunctionDescription, List[FunctionDescription]]]:
+        """Group methods of top-level classes tested by a single suite with a shared fixture"""
+        groups = []
+        for cls in self.code_extractor.extract_classes(file.content):
+            # methods of nested classes have their own class name, so they are processed separately
+            methods = [
+                func for func in functions
+                if func.class_name == cls.name and cls.start_line <= func.start_line <= cls.end_line
+            ]
+            if len(methods) >= self.settings.class_suites.min_methods:
+                groups.append((cls, methods))
+        return groups
+
+    @staticmethod
+    def deduplicate(functions: List[FunctionMessage]) -> None:
+        """Mark structurally identical functions to reuse the test generated for the first one"""
+        representatives = {}
+        for function in functions:
+            fingerprint = function.description.fingerprint
+            if fingerprint in representatives:
+                function.duplicate_of = representatives[fingerprint].id
             else:
-                generated_code = file_functions[0].generated_code
-            # generate test file name
-            source_file = Path(file.id)
-            test_file = source_file.with_name(f"test_{source_file.name}")
-            test = TestFileMessage(
-                id=test_file,
-                content=generated_code,
+                representatives[fingerprint] = function
+        duplicates = len(functions) - len(representatives)
+        if duplicates:
+            logger.info(
+                'Deduplication: %d of %d functions reuse tests of identical functions, '
+                'saved %d Explain/Plan/Generate cycles',
+                duplicates, len(functions), duplicates
             )
-            file.test = test
-            tests.append(test)
+
+    def assign_routes(self, functions: List[FunctionMessage]) -> None:
+        """Route simple functions to single-shot generation, complex ones to the full pipeline"""
+        routing = self.settings.routing
+        for function in functions:
+            if function.route == 'class':
+                continue
+            complexity = function.description.complexity
+            is_simple = routing.enabled \
+                and complexity.get('nodes', 0) <= routing.max_nodes \
+                and complexity.get('branches', 0) <= routing.max_branches \
+                and complexity.get('calls', 0) <= routing.max_calls
+            function.route = 'simple' if is_simple else 'full'
+        processed = [f for f in functions if not f.duplicate_of]
+        simple = sum(1 for f in processed if f.route == 'simple')
+        classes = sum(1 for f in processed if f.route == 'class')
+        logger.info(
+            'Routing: %d simple functions (single-shot), %d complex functions (Explain/Plan/Generate), '
+            '%d classes (shared fixture)',
+            simple, len(processed) - simple - classes, classes
+        )
+
+    @staticmethod
+    def adapt_test(source: FunctionMessage, target: FunctionMessage) -> Optional[str]:
+        """
+        Rewrite test generated for the source function to test the structurally identical target.
+        :return: Adapted test or None if it can not be adapted safely and the target must be processed itself.
+        """
+        source_class = source.description.class_name
+        target_class = target.description.class_name
+        renames = {}
+        if source_class and target_class:
+            if source.name != target.name and source.route != 'class':
+                # methods are called on instances, their calls can not be told apart from other attributes
+                return None
+            renames[source_class] = target_class
+        else:
+            renames[source.name] = target.name
+        return adapt_test(
+            source.generated_code,
+            source_module=module_name(source.file_message.id),
+            target_module=module_name(target.file_message.id),
+            renames=renames,
+            same_file=source.file_message.key == target.file_message.key,
+        )
+
+    @staticmethod
+    def is_changed(func: FunctionDescription, ranges: List[Tuple[int, int]]) -> bool:
+        """Check if any of the changed line ranges overlaps the function"""
+        return any(start <= func.end_line and func.start_line <= end for start, end in ranges)
+
+    def process(self, state: ProcessState, config: RunnableConfig) -> OutputGeneratorState:
+        """Process a single function and write test files of all functions completed by now"""
+        run = state['run']
+        function = self.generate(state['function'], config)
+        for duplicate in run.tracker.duplicates(function):
+            if function.status != 'done':
+                duplicate.status = 'failed'
+                duplicate.error = function.error
+                continue
+            adapted = self.adapt_test(function, duplicate)
+            if adapted is None:
+                logger.info('Unable to reuse the test of %s for %s, generating it', function.id, duplicate.id)
+                duplicate.duplicate_of = None
+                generated = self.generate(duplicate, config)
+                duplicate.generated_code = generated.generated_code if generated.status == 'done' else None
+                duplicate.status, duplicate.error = generated.status, generated.error
+                continue
+            duplicate.generated_code = adapted
+            duplicate.status = 'done'
+        tests = {}
+        failures = []
+        for file, file_functions in run.tracker.complete(function):
+            failures.extend(f for f in file_functions if f.status == 'failed')
+            succeeded = [f for f in file_functions if f.status == 'done']
+            if not succeeded:
+                logger.warning('No tests generated for %s', file.key)
+                continue
+            # duplicates may complete files of other roots
+            root = run.roots[file.root]
+            try:
+                test = self.merge(file, succeeded, root.get('target_folder'), root.get('changes'))
+                write_files(folder=root.get('target_folder'), files=[test])
+            except Exception as e:
+                logger.exception('Failed to merge and write tests of %s', file.key)
+                failures.extend(self.fail(succeeded, e))
+                continue
+            # the channel keeps the written path only, content of the test file is not needed anymore
+            tests[file.key] = join_path(root.get('target_folder'), test.id)
+            for f in succeeded:
+                f.generated_code = None
+        if tests:
+            logger.info('%d files left to generate', run.tracker.pending_files)
         return {
-            'files': files,
             'tests': tests,
+            'failures': {f.id: f for f in failures},
+        }
+
+    def summarize(self, state: GeneratorState) -> OutputGeneratorState:
+        """Summarize results per root"""
+        summary = {source_folder: dict(item) for source_folder, item in state['run'].summary.items()}
+        for item in summary.values():
+            item.update({'processed': 0, 'duplicates': 0, 'failed': 0, 'tests': 0, 'tokens_saved': 0,
+                         'routes': {'simple': 0, 'full': 0, 'class': 0}})
+        for function in state.get('functions', {}).values():
+            item = summary[function.file_message.root]
+            item['duplicates' if function.duplicate_of else 'processed'] += 1
+            if not function.duplicate_of:
+                item['routes'][function.route] += 1
+            item['tokens_saved'] += function.tokens_saved or 0
+            if function.status == 'failed':
+                item['failed'] += 1
+        for key in state.get('tests', {}):
+            source_folder = next(root for root in summary if key.startswith(f'{root}:'))
+            summary[source_folder]['tests'] += 1
+        return {
+            'summary': summary,
         }
 
+    def generate(self, function: FunctionMessage, config: RunnableConfig) -> FunctionMessage:
+        """Generate the test of a single function, a failure is recorded on the function"""
+        try:
+            response = self.processor.invoke({'function': function}, config)
+            function = response['functions'][function.id]
+            function.status = 'done'
+        except Exception as e:
+            # isolate the failure, so other functions and files are still processed
+            logger.exception('Failed to process function %s of %s', function.name, function.file_message.id)
+            self.fail([function], e)
+        return function
+
+    @staticmethod
+    def fail(functions: List[FunctionMessage], error: Exception) -> List[FunctionMessage]:
+        """Mark functions as failed with the error"""
+        for function in functions:
+            function.status = 'failed'
+            function.error = f'{type(error).__name__}: {error}'
+        return functions
+
+    def merge(self, file, functions: List[FunctionMessage], target_folder: str, changes) -> TestFileMessage:
+        """Merge generated tests of all functions of the file and splice them into the existing test file"""
+        # generate test file name
+        source_file = Path(file.id)
+        test_file = source_file.with_name(f"test_{source_file.name}")
+        generated_code = self.tree_merge([f.generated_code for f in functions])
+        existing_code = read_file(str(test_file), folder=target_folder)
+        if existing_code:
+            try:
+                # keep existing, possibly hand-written tests, in diff mode replace stale tests of changed functions
+                generated_code = self.existing_tests.splice(existing_code, generated_code, replace=changes is not None)
+            except (SyntaxError, ValueError) as e:
+                logger.warning('Unable to splice tests into %s, merging with the model: %s', test_file, e)
+                generated_code = self.tree_merge([existing_code, generated_code])
+        tokens_saved = sum(f.tokens_saved or 0 for f in functions)
+        if tokens_saved:
+            logger.info('History compaction saved %d prompt tokens for %s', tokens_saved, file.id)
+        return TestFileMessage(
+            id=test_file.as_posix(),
+            content=generated_code,
+        )
+
+    def tree_merge(self, test_codes: List[str]) -> str:
+        """Merge test snippets in parallel groups fitting the token budget, then merge partial results"""
+        budget = self.settings.merge.max_input_tokens
+        while len(test_codes) > 1:
+            token_counts = [self.model.count_tokens([HumanMessage(content=code)]) for code in test_codes]
+            groups = MergePipeline.group(token_counts, budget)
+            logger.debug('Merging %d test snippets in %d groups', len(test_codes), len(groups))
+            # model calls of parallel merges share the global budget of the model limiter
+            test_codes = self.merge_pipeline.batch(
+                [[test_codes[index] for index in group] for group in groups],
+                {'max_concurrency': self.settings.concurrency}
+            )
+        return test_codes[0]
+
     def build(self) -> CompiledStateGraph:
         graph_builder = StateGraph(
             input=InputGeneratorState,
@@ -100,22 +398,22 @@ class GeneratorGraph(BaseGraph):
 
         # define nodes
         graph_builder.add_node('Describe', self.describe)
-        processor = ProcessorGraph()
-        graph_builder.add_node(processor.name, processor.build(), input=processor.input_schema)
-        graph_builder.add_node('Merge', self.merge)
+        graph_builder.add_node('Process', self.process, input=ProcessState)
+        graph_builder.add_node('Summarize', self.summarize)
 
         # define edges
         graph_builder.add_edge(START, 'Describe')
         graph_builder.add_conditional_edges(
             'Describe',
             lambda state: [
-                Send(processor.name, {'function': function})
-                for function in state['functions']
-            ],
-            [processor.name]
+                Send('Process', {'function': function, 'run': state['run']})
+                for function in state['functions'].values()
+                if not function.duplicate_of
+            ] or ['Summarize'],
+            ['Process', 'Summarize']
         )
-        graph_builder.add_edge(processor.name, 'Merge')
-        graph_builder.add_edge('Merge', END)
+        graph_builder.add_edge('Process', 'Summarize')
+        graph_builder.add_edge('Summarize', END)
 
         graph = graph_builder.compile()
         return graph
@@ -1,28 +1,30 @@
-from typing import List, Annotated
+from typing import Any, List, Dict, Optional, Tuple
 
-from langchain_core.messages.base import BaseMessage
 from langgraph.graph import StateGraph, START, END
-from langgraph.graph.message import add_messages
 from langgraph.graph.state import CompiledStateGraph
 from typing_extensions import TypedDict
 
 from testgen.graph.base import BaseGraph
 from testgen.graph.generator import GeneratorGraph
 from testgen.graph.scanner import ScannerGraph
-from testgen.graph.writer import WriterGraph
+from testgen.graph.state import KeyedMessages, KeyedPaths, RootState
 
 
 class InputMainState(TypedDict):
     source_folder: str
     target_folder: str
+    changes: Optional[Dict[str, List[Tuple[int, int]]]]
+    roots: Optional[List[RootState]]
 
 
 class OutputMainState(TypedDict):
-    tests: Annotated[List[BaseMessage], add_messages]
+    tests: KeyedPaths
+    failures: KeyedMessages
+    summary: Dict[str, Dict[str, Any]]
 
 
 class MainState(InputMainState, OutputMainState):
-    files: Annotated[List[BaseMessage], add_messages]
+    files: KeyedMessages
 
 
 class MainGraph(BaseGraph):
@@ -41,14 +43,27 @@ class MainGraph(BaseGraph):
         graph_builder.add_node(scanner.name, scanner.build(), input=scanner.input_schema)
         generator = GeneratorGraph()
         graph_builder.add_node(generator.name, generator.build(), input=generator.input_schema)
-        writer = WriterGraph()
-        graph_builder.add_node(writer.name, writer.build(), input=writer.input_schema)
 
         # define edges
         graph_builder.add_edge(START, scanner.name)
         graph_builder.add_edge(scanner.name, generator.name)
-        graph_builder.add_edge(generator.name, writer.name)
-        graph_builder.add_edge(writer.name, END)
+        # test files are written by the generator as soon as each of them is complete
+        graph_builder.add_edge(generator.name, END)
 
         graph = graph_builder.compile()
         return graph
+
+
+def format_summary(summary: Dict[str, Dict[str, Any]]) -> str:
+    """Format per-root results of the run as a human-readable report"""
+    lines = []
+    for item in summary.values():
+        lines.append(
+            f"{item['source_folder']} -> {item['target_folder']}: {item['files']} files, "
+            f"{item['functions']} functions ({item['duplicates']} duplicates, {item['skipped']} already tested), "
+            f"routed {item['routes']['simple']} simple, {item['routes']['full']} full, "
+            f"{item['routes']['class']} class suites, "
+            f"{item['failed']} failed, {item['tests']} test files written, "
+            f"{item['tokens_saved']} prompt tokens saved by history compaction"
+        )
+    return '\n'.join(lines) or 'Nothing processed'
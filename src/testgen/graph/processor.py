@@ -1,7 +1,8 @@
 import logging
 from typing import List, Annotated
 
-from langchain_core.messages import BaseMessage, AIMessage
+from dependency_injector.wiring import Provide, inject
+from langchain_core.messages import BaseMessage, AIMessage, RemoveMessage
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
 from langgraph.graph.state import CompiledStateGraph
@@ -9,9 +10,14 @@ from typing_extensions import TypedDict
 
 from testgen.di import DIContainer
 from testgen.graph.base import BaseGraph
+from testgen.graph.state import KeyedMessages
 from testgen.pipeline.explain import ExplainPipeline
+from testgen.pipeline.fixture import FixturePipeline
 from testgen.pipeline.generate import GeneratePipeline
+from testgen.pipeline.method_tests import MethodTestsPipeline
 from testgen.pipeline.plan import PlanPipeline
+from testgen.pipeline.single_shot import SingleShotPipeline
+from testgen.service.compaction import HistoryCompactor
 
 logger = logging.getLogger(__name__)
 
@@ -21,22 +27,78 @@ class InputProcessorState(TypedDict):
 
 
 class OutputProcessorState(TypedDict):
-    functions: Annotated[List[BaseMessage], add_messages]
+    functions: KeyedMessages
 
 
 class ProcessorState(InputProcessorState, OutputProcessorState):
     messages: Annotated[List[BaseMessage], add_messages]
+    fixture: str
 
 
 class ProcessorGraph(BaseGraph):
     node_name = 'Processor'
     input_schema = InputProcessorState
 
-    def __init__(self, *args, **kwargs):
+    @inject
+    def __init__(
+            self,
+            history_compactor: HistoryCompactor = Provide[DIContainer.history_compactor],
+            *args,
+            **kwargs
+    ):
         super().__init__(*args, **kwargs)
+        self.history_compactor = history_compactor
         self.explain_pipeline = ExplainPipeline()
         self.plan_pipeline = PlanPipeline()
         self.generate_pipeline = GeneratePipeline()
+        self.single_shot_pipeline = SingleShotPipeline()
+        self.fixture_pipeline = FixturePipeline()
+        self.method_tests_pipeline = MethodTestsPipeline()
+
+    @staticmethod
+    def route(state: InputProcessorState) -> str:
+        """Choose the processing route of the function"""
+        route = state['function'].route
+        if route == 'class':
+            return 'Fixture'
+        return 'SingleShot' if route == 'simple' else 'Explain'
+
+    def single_shot(self, state: ProcessorState) -> OutputProcessorState:
+        """Generate unit tests for a simple function in a single model call"""
+        function = state['function']
+        function.generated_code = self.single_shot_pipeline.get_pipeline().invoke(function)
+        return {
+            'functions': {function.id: function}
+        }
+
+    def fixture(self, state: ProcessorState) -> ProcessorState:
+        """Generate the fixture shared by tests of all methods of the class"""
+        fixture = self.fixture_pipeline.get_pipeline().invoke(state['function'])
+        return {
+            'fixture': fixture
+        }
+
+    def method_tests(self, state: ProcessorState) -> OutputProcessorState:
+        """Generate tests of the class methods against the fixture, a batch of methods per model call"""
+        function = state['function']
+        fixture = state['fixture']
+        size = self.settings.class_suites.methods_per_call
+        batches = [function.methods[i:i + size] for i in range(0, len(function.methods), size)]
+        # model calls of parallel batches share the global budget of the model limiter
+        tests = self.method_tests_pipeline.get_pipeline().batch(
+            [
+                {'function': function, 'fixture': fixture, 'methods': batch, 'index': index if len(batches) > 1 else 0}
+                for index, batch in enumerate(batches, start=1)
+            ],
+            {'max_concurrency': self.settings.concurrency}
+        )
+        logger.info('Generated class suite of %s: %d methods in %d calls',
+                    function.name, len(function.methods), len(batches) + 1)
+        # suites of the class are one snippet for the merge, so it does not reconcile per-method fixtures
+        function.generated_code = '\n\n\n'.join([fixture] + tests)
+        return {
+            'functions': {function.id: function}
+        }
 
     def explain(self, state: ProcessorState) -> ProcessorState:
         function = state['function']
@@ -64,6 +126,22 @@ class ProcessorGraph(BaseGraph):
             'messages': messages
         }
 
+    def compact(self, state: ProcessorState) -> ProcessorState:
+        """Replace the conversation history with a bounded digest before the Generate step"""
+        messages = state['messages']
+        function = state['function']
+        digest = self.history_compactor.compact(function, messages)
+        tokens_before = self.model.count_tokens(messages)
+        tokens_after = self.model.count_tokens([digest])
+        function.tokens_saved = tokens_before - tokens_after
+        logger.info(
+            'Compacted history of %s: %d -> %d tokens (%d saved)',
+            function.name, tokens_before, tokens_after, function.tokens_saved
+        )
+        return {
+            'messages': [RemoveMessage(id=m.id) for m in messages] + [digest]
+        }
+
     def generate(self, state: ProcessorState) -> OutputProcessorState:
         messages = state['messages']
         function = state['function']
@@ -73,7 +151,7 @@ class ProcessorGraph(BaseGraph):
         response = self.generate_pipeline.get_pipeline().invoke(input_data)
         function.generated_code = response
         return {
-            'functions': [function]
+            'functions': {function.id: function}
         }
 
     def build(self) -> CompiledStateGraph:
@@ -87,11 +165,22 @@ class ProcessorGraph(BaseGraph):
         graph_builder.add_node('Explain', self.explain)
         graph_builder.add_node('Plan', self.plan)
         graph_builder.add_node('Generate', self.generate)
+        graph_builder.add_node('SingleShot', self.single_shot)
+        graph_builder.add_node('Fixture', self.fixture)
+        graph_builder.add_node('MethodTests', self.method_tests)
 
         # define edges
-        graph_builder.add_edge(START, 'Explain')
+        graph_builder.add_conditional_edges(START, self.route, ['SingleShot', 'Explain', 'Fixture'])
+        graph_builder.add_edge('SingleShot', END)
+        graph_builder.add_edge('Fixture', 'MethodTests')
+        graph_builder.add_edge('MethodTests', END)
         graph_builder.add_edge('Explain', 'Plan')
-        graph_builder.add_edge('Plan', 'Generate')
+        if self.settings.compaction.enabled:
+            graph_builder.add_node('Compact', self.compact)
+            graph_builder.add_edge('Plan', 'Compact')
+            graph_builder.add_edge('Compact', 'Generate')
+        else:
+            graph_builder.add_edge('Plan', 'Generate')
         graph_builder.add_edge('Generate', END)
 
         graph = graph_builder.compile()
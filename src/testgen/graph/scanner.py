@@ -1,22 +1,26 @@
-from typing import List, Annotated
+import os
+from pathlib import Path
+from typing import List, Dict, Optional, Tuple
 
-from langchain_core.messages.base import BaseMessage
 from langgraph.graph import StateGraph, START, END
-from langgraph.graph.message import add_messages, RemoveMessage
 from langgraph.graph.state import CompiledStateGraph
 from typing_extensions import TypedDict
 
 from testgen.di import DIContainer
 from testgen.graph.base import BaseGraph
-from testgen.tools.storage import list_files
+from testgen.graph.state import KeyedMessages, RootState, get_roots
+from testgen.tools.storage import list_files, read_files
 
 
 class InputScannerState(TypedDict):
     source_folder: str
+    target_folder: str
+    changes: Optional[Dict[str, List[Tuple[int, int]]]]
+    roots: Optional[List[RootState]]
 
 
 class OutputScannerState(TypedDict):
-    files: Annotated[List[BaseMessage], add_messages]
+    files: KeyedMessages
 
 
 class ScannerState(InputScannerState, OutputScannerState):
@@ -27,13 +31,31 @@ class ScannerGraph(BaseGraph):
     node_name = 'Scanner'
     input_schema = InputScannerState
 
+    @staticmethod
+    def exclude_target_folder(source_folder: str, target_folder: Optional[str]) -> List[str]:
+        """Exclude generated tests when the target folder is inside the source folder"""
+        if target_folder:
+            relative = os.path.relpath(os.path.normpath(target_folder), os.path.normpath(source_folder))
+            if relative != '.' and not relative.startswith('..'):
+                return [f"/{Path(relative).as_posix()}/"]
+        return []
+
     @staticmethod
     def scan_source_folder(state: InputScannerState) -> ScannerState:
-        """Scan file storage for all available Python files"""
-        source_folder = state['source_folder']
-        files = list_files(
-            folder=source_folder,
-        )
+        """Scan file storage for all available Python files of every source folder"""
+        files = {}
+        for root in get_roots(state):
+            source_folder = root['source_folder']
+            exclude = ScannerGraph.exclude_target_folder(source_folder, root.get('target_folder'))
+            changes = root.get('changes')
+            if changes is not None:
+                # git-diff mode: read only the changed files instead of walking the whole folder
+                root_files = read_files(list(changes), folder=source_folder, exclude=exclude)
+            else:
+                root_files = list_files(folder=source_folder, exclude=exclude)
+            for file in root_files:
+                file.root = source_folder
+                files[file.key] = file
         return {
             'files': files,
         }
@@ -42,11 +64,16 @@ class ScannerGraph(BaseGraph):
     def filter(state: ScannerState) -> ScannerState:
         """Filter messages that not suitable for generating unit tests"""
         # TODO implement real filter using LLM
-        files = list(state['files'])
-        filtered = []
+        files = state['files'].values()
+        changes_by_root = {root['source_folder']: root.get('changes') for root in get_roots(state)}
+        filtered = {}
         for file in files:
+            changes = changes_by_root.get(file.root)
             if '500' in file.id:
-                filtered.append(RemoveMessage(id=file.id))
+                filtered[file.key] = None
+            elif changes is not None and file.id not in changes:
+                # git-diff mode: skip files untouched by the diff
+                filtered[file.key] = None
         return {
             'files': filtered
         }
@@ -0,0 +1,79 @@
+from typing import Any, Callable, Dict, List, Sequence, Type, Union, Annotated, Optional, Tuple
+
+from langchain_core.messages import RemoveMessage
+from langchain_core.messages.base import BaseMessage
+from langgraph.channels.binop import BinaryOperatorAggregate
+from typing_extensions import TypedDict
+
+
+def merge_by_id(
+        left: Optional[Dict[str, BaseMessage]],
+        right: Union[Dict[str, Optional[BaseMessage]], List[BaseMessage]]
+) -> Dict[str, BaseMessage]:
+    """
+    Merge messages keyed by id into the state channel.
+    Unlike `add_messages` the merge cost depends only on the size of the update, not the channel.
+    :param left: Current channel value, updated in place, so it must not be referenced by anyone else.
+    :param right: Update as a mapping of id to message or a list of messages.
+                  None value or RemoveMessage removes the message from the channel.
+    :return: Merged channel value.
+    """
+    if left is None:
+        left = {}
+    if right is left:
+        return left
+    if isinstance(right, (list, tuple)):
+        right = {str(message.id): message for message in right}
+    for key, value in right.items():
+        if value is None or isinstance(value, RemoveMessage):
+            left.pop(key, None)
+        else:
+            left[key] = value
+    return left
+
+
+class RootState(TypedDict):
+    """Source folder and target folder of its tests processed by a multi-root run"""
+    source_folder: str
+    target_folder: str
+    changes: Optional[Dict[str, List[Tuple[int, int]]]]
+
+
+def get_roots(state: Dict[str, Any]) -> List[RootState]:
+    """Returns roots of the run, a single root of the `source_folder` and `target_folder` keys by default"""
+    roots = state.get('roots')
+    if roots:
+        return roots
+    return [{
+        'source_folder': state['source_folder'],
+        'target_folder': state.get('target_folder'),
+        'changes': state.get('changes'),
+    }]
+
+
+class KeyedMessagesChannel(BinaryOperatorAggregate):
+    """
+    Channel of messages keyed by id.
+    The value is copied once per superstep and all updates of the superstep are merged into the copy in place,
+    so the merge cost stays linear in the number of updates, while values read by nodes or returned
+    by streams of the previous steps are never mutated.
+    """
+
+    def __init__(self, typ: Type = dict, operator: Callable = merge_by_id):
+        super().__init__(typ, operator)
+
+    def update(self, values: Sequence[Any]) -> bool:
+        if not values:
+            return False
+        value = self.value if isinstance(self.value, dict) else {}
+        self.value = dict(value)
+        for update in values:
+            self.value = self.operator(self.value, update)
+        return True
+
+
+KeyedMessages = Annotated[dict, KeyedMessagesChannel]
+"""State channel of messages keyed by id"""
+
+KeyedPaths = Annotated[Dict[str, str], KeyedMessagesChannel]
+"""State channel of file paths keyed by id, e.g. written test files instead of their content"""
@@ -1,15 +1,26 @@
+import os
 from functools import cache
+from typing import List
 
 from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage
 
+from testgen.service.http import HttpClientPool
 from testgen.settings import Settings
 
+# model types supporting native JSON schema (structured) output
+STRUCTURED_OUTPUT_MODEL_TYPES = {'openai'}
+# model parameters and environment variables pointing the client to a custom OpenAI-compatible server
+BASE_URL_PARAMS = ('base_url', 'openai_api_base')
+BASE_URL_ENV = ('OPENAI_BASE_URL', 'OPENAI_API_BASE')
+
 
 class ChatModel:
     """LLM connector"""
 
-    def __init__(self, settings: Settings):
+    def __init__(self, settings: Settings, http_pool: HttpClientPool):
         self.settings = settings
+        self.http_pool = http_pool
 
     @property
     @cache
@@ -17,10 +28,33 @@ class ChatModel:
         """Returns ChatGPT client to communicate with LLM"""
         model_settings = self.settings.model
         model_type = model_settings.type
-        params = model_settings.params
+        params = dict(model_settings.params)
+        requests_per_minute = self.settings.rate_limit.requests_per_minute
+        if requests_per_minute:
+            from langchain_core.rate_limiters import InMemoryRateLimiter
+            params['rate_limiter'] = InMemoryRateLimiter(requests_per_second=requests_per_minute / 60)
         if model_type.name == 'openai':
             from langchain_openai import ChatOpenAI
+            # every model call shares the pooled connections of the DI container
+            params.setdefault('http_client', self.http_pool.client)
+            params.setdefault('http_async_client', self.http_pool.async_client)
             client = ChatOpenAI(**params)
         else:
             raise NotImplementedError(f'Unsupported model type: {model_type.name}')
         return client
+
+    @property
+    def supports_structured_output(self) -> bool:
+        """Check if structured output is enabled and supported by the model backend"""
+        model_settings = self.settings.model
+        if model_settings.type.name not in STRUCTURED_OUTPUT_MODEL_TYPES:
+            return False
+        if model_settings.structured_output is not None:
+            return model_settings.structured_output
+        # OpenAI API supports JSON schema output, custom OpenAI-compatible servers may not
+        return not any(model_settings.params.get(key) for key in BASE_URL_PARAMS) \
+            and not any(os.environ.get(name) for name in BASE_URL_ENV)
+
+    def count_tokens(self, messages: List[BaseMessage]) -> int:
+        """Count prompt tokens of the messages locally, without calling LLM"""
+        return self.client.get_num_tokens_from_messages(messages)
@@ -1,23 +1,107 @@
+from typing import List, Tuple
+
 import click
+import yaml
 
 from testgen.di import DIContainer
-from testgen.graph import MainGraph
+from testgen.graph import EstimateGraph, MainGraph
+from testgen.graph.estimate import format_estimate
+from testgen.graph.main import format_summary
+from testgen.service.http import format_http_summary
+from testgen.service.tracer import format_trace_summary
+from testgen.tools import read_failure_report, write_failure_report
+from testgen.watch import watch
+
+
+def read_manifest(path: str) -> List[Tuple[str, str]]:
+    """
+    Read source and target folder pairs from a YAML or JSON manifest, either a list
+    of `{source_folder, target_folder}` mappings or a mapping with such list under `roots`.
+    """
+    with open(path, encoding='utf-8') as f:
+        manifest = yaml.safe_load(f) or []
+    if isinstance(manifest, dict):
+        manifest = manifest.get('roots', [])
+    try:
+        return [(item['source_folder'], item['target_folder']) for item in manifest]
+    except (KeyError, TypeError) as e:
+        raise click.BadParameter(f'Invalid manifest entry, expected source_folder and target_folder: {e}')
+
+
+def parse_root(value: str) -> Tuple[str, str]:
+    source_folder, separator, target_folder = value.partition(':')
+    if not separator or not source_folder or not target_folder:
+        raise click.BadParameter(f"Expected SOURCE:TARGET, got '{value}'")
+    return source_folder, target_folder
 
 
 @click.command()
-def main():
+@click.option('--since', default=None, help='Generate tests only for functions changed since the git ref.')
+@click.option('--diff', 'diff_range', default=None,
+              help='Generate tests only for functions changed in the git range <a>..<b>.')
+@click.option('--dry-run', is_flag=True, default=False,
+              help='Estimate model calls, tokens, cost and duration without calling the model.')
+@click.option('--top', default=10, show_default=True, help='Number of top items in the dry-run and trace reports.')
+@click.option('--retry-failed', is_flag=True, default=False,
+              help='Reprocess only functions failed in the previous run.')
+@click.option('--watch', 'watch_mode', is_flag=True, default=False,
+              help='Watch the source folder and generate tests for edited functions on save.')
+@click.option('--trace', 'trace_file', default=None,
+              help='Write Chrome trace-event JSON of the run into the file and print its critical path.')
+@click.option('--root', 'root_pairs', multiple=True,
+              help='Source and target folder pair SOURCE:TARGET to process, can be repeated.')
+@click.option('--manifest', default=None, type=click.Path(exists=True, dir_okay=False),
+              help='YAML or JSON file listing source_folder and target_folder pairs to process.')
+def main(since: str, diff_range: str, dry_run: bool, top: int, retry_failed: bool, watch_mode: bool,
+         trace_file: str, root_pairs: Tuple[str, ...], manifest: str):
     di = DIContainer()
     di.wire(packages=[
         'testgen',
         'testgen.graph',
         'testgen.tools',
     ])
+    if trace_file:
+        di.settings().trace = trace_file
+    pairs = [parse_root(value) for value in root_pairs] + (read_manifest(manifest) if manifest else [])
+    if not pairs:
+        pairs = [('src', 'test')]
+    if watch_mode:
+        if len(pairs) > 1:
+            raise click.UsageError('Watch mode supports a single source folder')
+        watch(*pairs[0])
+        return
+    # all roots run in one graph execution sharing the concurrency pool and the model rate limiter
+    roots = []
+    for source_folder, target_folder in pairs:
+        changes = None
+        if since or diff_range:
+            changes = di.git_diff().changed_lines(folder=source_folder, since=since, diff=diff_range)
+        if retry_failed:
+            # failed functions are reprocessed like changed ones and merged with the existing tests
+            changes = changes if changes is not None else {}
+            for file_id, ranges in read_failure_report(source_folder).items():
+                changes.setdefault(file_id, []).extend(ranges)
+        roots.append({'source_folder': source_folder, 'target_folder': target_folder, 'changes': changes})
+    input_data = {**roots[0], 'roots': roots}
+    if dry_run:
+        response = EstimateGraph().run({**input_data, 'top': top})
+        print(format_estimate(response['estimate']))
+        return
     graph = MainGraph()
-    response = graph.run({
-        'source_folder': 'src',
-        'target_folder': 'test'
-    })
+    try:
+        response = graph.run(input_data)
+        write_failure_report(list(response.get('failures', {}).values()))
+    finally:
+        # archive storage writes the output archive on close
+        di.storage().close()
+        http_pool = di.http_pool()
+        http_pool.close()
+        if http_pool.metrics.requests:
+            print(format_http_summary(http_pool.metrics.summary()))
+        if di.settings().trace:
+            print(format_trace_summary(di.tracer().export(), top=top))
     print(response)
+    print(format_summary(response.get('summary', {})))
 
 
 if __name__ == '__main__':
@@ -1,6 +1,7 @@
 from testgen.models.code import (
     FunctionDescription,
     FileMessage,
+    FileRef,
     FunctionMessage,
     TestFileMessage,
 )
@@ -8,6 +9,7 @@ from testgen.models.code import (
 __all__ = [
     'FunctionDescription',
     'FileMessage',
+    'FileRef',
     'FunctionMessage',
     'TestFileMessage',
 ]
@@ -1,4 +1,4 @@
-from typing import Literal, Optional, List
+from typing import Dict, Literal, Optional, List
 
 from langchain_core.messages import BaseMessage
 from pydantic import BaseModel, Field
@@ -9,6 +9,13 @@ class FunctionDescription(BaseModel):
     name: str = Field(description='Name of the function or method')
     body: str = Field(
         description='Full source code of the function or method including decorators, name, docstring and comments')
+    start_line: Optional[int] = Field(default=None, description='First line of the function including decorators')
+    end_line: Optional[int] = Field(default=None, description='Last line of the function')
+    class_name: Optional[str] = Field(default=None, description='Name of the class for methods')
+    complexity: Dict[str, int] = Field(
+        default_factory=dict, description='Complexity metrics: AST nodes, branches and external calls')
+    fingerprint: Optional[str] = Field(
+        default=None, description='Structural fingerprint ignoring local names, docstrings and formatting')
 
 
 class FileMessage(BaseMessage):
@@ -23,6 +30,26 @@ class FileMessage(BaseMessage):
     test: Optional['TestFileMessage'] = None
     """The unit test file"""
 
+    root: Optional[str] = None
+    """Source folder of the file, the id is relative to it"""
+
+    @property
+    def key(self) -> str:
+        """Id of the file unique across source folders of a multi-root run"""
+        return f'{self.root}:{self.id}' if self.root else str(self.id)
+
+
+class FileRef(BaseModel):
+    """Reference to a source file whose content is kept in the blob store"""
+    id: str = Field(description='Path of the file')
+    content_hash: str = Field(description='Hash of the file content in the blob store')
+    root: Optional[str] = Field(default=None, description='Source folder of the file, the id is relative to it')
+
+    @property
+    def key(self) -> str:
+        """Id of the file unique across source folders of a multi-root run"""
+        return f'{self.root}:{self.id}' if self.root else self.id
+
 
 class FunctionMessage(BaseMessage):
     """Message to keep information about a function"""
@@ -30,12 +57,37 @@ class FunctionMessage(BaseMessage):
     type: Literal['code'] = 'function'
     """The type of the message (used for deserialization). Defaults to "function"."""
 
-    file_message: FileMessage
-    """Link to the file message"""
+    file_message: FileRef
+    """Reference to the file, pipelines resolve the content from the blob store"""
+
+    description: Optional[FunctionDescription] = None
+    """The function description"""
+
+    route: Optional[str] = None
+    """Processing route: 'simple' for single-shot generation, 'full' for Explain, Plan and Generate
+    or 'class' for a class-level suite with a shared fixture"""
+
+    methods: Optional[List[FunctionDescription]] = None
+    """Methods tested by the class-level suite"""
+
+    duplicate_of: Optional[str] = None
+    """Id of the structurally identical function message whose generated test is reused"""
+
+    context: Optional[str] = None
+    """Compact stubs of project symbols from other modules referenced by the function"""
 
     generated_code: Optional[str] = None
     """The generated unit test code"""
 
+    status: Literal['pending', 'done', 'failed'] = 'pending'
+    """The processing status"""
+
+    error: Optional[str] = None
+    """The processing error of failed function"""
+
+    tokens_saved: Optional[int] = None
+    """Prompt tokens saved by the conversation history compaction"""
+
 
 class TestFileMessage(BaseMessage):
     """Message to keep information about a test file"""
@@ -1,11 +1,17 @@
 from testgen.pipeline.explain import ExplainPipeline
+from testgen.pipeline.fixture import FixturePipeline
 from testgen.pipeline.generate import GeneratePipeline
 from testgen.pipeline.merge import MergePipeline
+from testgen.pipeline.method_tests import MethodTestsPipeline
 from testgen.pipeline.plan import PlanPipeline
+from testgen.pipeline.single_shot import SingleShotPipeline
 
 __all__ = [
     'ExplainPipeline',
+    'FixturePipeline',
     'GeneratePipeline',
     'MergePipeline',
+    'MethodTestsPipeline',
     'PlanPipeline',
+    'SingleShotPipeline',
 ]
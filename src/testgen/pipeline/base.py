@@ -1,28 +1,68 @@
+import ast
+import logging
+import re
 from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional, Type
 
 from dependency_injector.wiring import Provide, inject
+from langchain_core.exceptions import OutputParserException
 from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage
 from langchain_core.output_parsers.base import BaseOutputParser
+from langchain_core.output_parsers.pydantic import PydanticOutputParser
 from langchain_core.output_parsers.string import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.runnables import Runnable, RunnableLambda
+from pydantic import BaseModel
 
 from testgen.di import DIContainer
 from testgen.llm import ChatModel
+from testgen.models import FunctionMessage
+from testgen.service.blobs import BlobStore
+from testgen.service.limiter import ModelLimiter
+
+logger = logging.getLogger(__name__)
+
+CODE_BLOCK = re.compile(r'```(?:python|py)?[ \t]*\n(.*?)```', re.DOTALL)
 
 
 class BasePipeline(ABC):
 
     @inject
-    def __init__(self, model: ChatModel = Provide[DIContainer.model]):
+    def __init__(
+            self,
+            model: ChatModel = Provide[DIContainer.model],
+            blob_store: BlobStore = Provide[DIContainer.blob_store],
+            model_limiter: ModelLimiter = Provide[DIContainer.model_limiter],
+    ):
         self.model = model
+        self.blob_store = blob_store
+        self.model_limiter = model_limiter
+
+    def get_source(self, function: FunctionMessage) -> str:
+        """Returns source code of the file of the function"""
+        return self.blob_store.get(function.file_message.content_hash)
 
     def get_pipeline(self) -> Runnable:
         input_pipeline = self.get_input()
         model = self.get_model()
-        parser = self.get_output_parser()
         postprocessor = self.get_postprocessor()
-        return input_pipeline | model | parser | postprocessor
+        schema = self.get_output_schema()
+        if schema is None:
+            parser = self.get_output_parser()
+            return input_pipeline | self.model_limiter.limit_calls(model) | parser | postprocessor
+
+        if self.model.supports_structured_output:
+            structured_model = model.with_structured_output(schema, method='json_schema', include_raw=True)
+            output = self.model_limiter.limit_calls(structured_model) | RunnableLambda(self.repair_structured_output)
+        else:
+            output = self.model_limiter.limit_calls(model) | RunnableLambda(self.repair_output)
+        # output is repaired locally first, the model is called again only if the repair fails
+        output = output.with_retry(
+            retry_if_exception_type=(OutputParserException,),
+            stop_after_attempt=1 + self.model.settings.model.parse_retries,
+        )
+        return input_pipeline | output | postprocessor
 
     def get_input(self) -> Runnable:
         """Helper method to return full model input pipeline"""
@@ -43,10 +83,68 @@ class BasePipeline(ABC):
         """Returns the model object"""
         return self.model.client
 
+    def get_output_schema(self) -> Optional[Type[BaseModel]]:
+        """Returns pydantic model of the structured model output or None for plain text output"""
+        return None
+
     def get_output_parser(self) -> BaseOutputParser:
         """Returns output parser"""
+        schema = self.get_output_schema()
+        if schema is not None:
+            return PydanticOutputParser(pydantic_object=schema)
         return StrOutputParser()
 
+    def get_format_instructions(self) -> str:
+        """Returns output format instructions for the prompt, not needed for native structured output"""
+        if self.get_output_schema() is None or self.model.supports_structured_output:
+            return ''
+        return self.get_output_parser().get_format_instructions()
+
+    def repair_structured_output(self, output: Dict[str, Any]) -> BaseModel:
+        """Returns parsed structured output or repairs the raw model response"""
+        if output.get('parsed') is not None:
+            return output['parsed']
+        logger.warning('Structured output parsing failed: %s', output.get('parsing_error'))
+        return self.repair_output(output['raw'])
+
+    def repair_output(self, message: BaseMessage) -> BaseModel:
+        """
+        Parse the model response into the output schema.
+        Malformed responses are repaired locally, e.g. by extracting a fenced code block,
+        when the schema has a single string field.
+        """
+        text = message.content if isinstance(message, BaseMessage) else str(message)
+        try:
+            return self.get_output_parser().parse(text)
+        except OutputParserException:
+            schema = self.get_output_schema()
+            fields = list(schema.model_fields)
+            if len(fields) != 1:
+                raise
+            code = self.extract_code(text)
+            if code is None:
+                raise
+            logger.warning('Repaired malformed %s output locally', schema.__name__)
+            return schema(**{fields[0]: code})
+
+    @staticmethod
+    def extract_code(text: str) -> Optional[str]:
+        """
+        Extract Python code from the model response: the longest fenced block or the whole response
+        if it is valid code defining something. Prose or JSON may parse as Python too, it is not code.
+        """
+        blocks = CODE_BLOCK.findall(text)
+        if blocks:
+            return max(blocks, key=len).strip() + '\n'
+        try:
+            tree = ast.parse(text)
+        except SyntaxError:
+            return None
+        definitions = (ast.Import, ast.ImportFrom, ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+        if not any(isinstance(node, definitions) for node in tree.body):
+            return None
+        return text
+
     def get_postprocessor(self) -> Runnable:
         """Returns postprocessor to convert parsed model output to desired format."""
         return RunnableLambda(lambda x: x)
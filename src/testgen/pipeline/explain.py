@@ -1,4 +1,4 @@
-from typing import Dict
+from typing import Dict, Optional
 
 from langchain_core.messages import SystemMessage
 from langchain_core.prompts import ChatPromptTemplate
@@ -15,12 +15,25 @@ class ExplainPipeline(BasePipeline):
         def func(function: FunctionMessage) -> Dict[str, str]:
             return {
                 'full_path': function.file_message.id,
-                'full_source_code': function.file_message.content,
+                'full_source_code': self.get_source(function),
                 'function_code': function.content,
+                'context': self.format_context(function.context),
             }
 
         return RunnableLambda(func)
 
+    @staticmethod
+    def format_context(context: Optional[str]) -> str:
+        if not context:
+            return ''
+        return f"""
+Definitions from other modules of the project referenced by the function:
+
+```python
+{context}
+```
+"""
+
     def get_prompt(self) -> ChatPromptTemplate:
         system_message = SystemMessage(content="""\
 You are a world-class Python developer with an eagle eye for unintended bugs and edge cases. \
@@ -34,7 +47,7 @@ Full Python module source code with full path: {full_path}:
 ```python
 {full_source_code}
 ```
-""")
+{context}""")
         user_message = HumanMessagePromptTemplate.from_template("""\
 Review and explain the following Python function of the module above. \
 Review what each element of the function is doing precisely and what the author's intentions may have been. \
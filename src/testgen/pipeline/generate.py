@@ -1,7 +1,6 @@
-from typing import Dict, Any
+from typing import Dict, Any, Type
 
 from langchain_core.messages import SystemMessage
-from langchain_core.output_parsers.pydantic import PydanticOutputParser
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.prompts.chat import HumanMessagePromptTemplate
 from langchain_core.runnables import Runnable, RunnableLambda
@@ -22,7 +21,7 @@ class GeneratePipeline(BasePipeline):
             messages = list(filter(lambda x: not isinstance(x, SystemMessage), messages))
             return {
                 'messages': messages,
-                'format_instructions': self.get_output_parser().get_format_instructions()
+                'format_instructions': self.get_format_instructions()
             }
 
         return RunnableLambda(func)
@@ -49,8 +48,8 @@ Make sure the generated Python code is compilable.
         ])
         return prompt
 
-    def get_output_parser(self) -> PydanticOutputParser:
-        return PydanticOutputParser(pydantic_object=GeneratedCode)
+    def get_output_schema(self) -> Type[GeneratedCode]:
+        return GeneratedCode
 
     def get_postprocessor(self) -> Runnable:
         return RunnableLambda(lambda x: x.source_code)
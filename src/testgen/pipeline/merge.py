@@ -1,13 +1,11 @@
-from typing import Dict, List
+from typing import Dict, List, Type
 
 from langchain_core.messages import SystemMessage
-from langchain_core.output_parsers.pydantic import PydanticOutputParser
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.prompts.chat import HumanMessagePromptTemplate
 from langchain_core.runnables import Runnable, RunnableLambda
 from pydantic import BaseModel, Field
 
-from testgen.models import FunctionMessage
 from testgen.pipeline.base import BasePipeline
 
 
@@ -17,16 +15,42 @@ class MergedCode(BaseModel):
 
 class MergePipeline(BasePipeline):
 
+    @staticmethod
+    def group(token_counts: List[int], budget: int) -> List[List[int]]:
+        """
+        Split test snippets into groups merged by a single call each.
+        :param token_counts: Number of tokens of each snippet.
+        :param budget: Token budget of a group, a group has at least two snippets whenever possible.
+        :return: List of groups of snippet indexes.
+        """
+        groups = []
+        group = []
+        group_tokens = 0
+        for index, tokens in enumerate(token_counts):
+            if len(group) > 1 and group_tokens + tokens > budget:
+                groups.append(group)
+                group = []
+                group_tokens = 0
+            group.append(index)
+            group_tokens += tokens
+        if group:
+            if len(group) == 1 and groups:
+                # do not leave a single snippet, it would not make any progress
+                groups[-1].extend(group)
+            else:
+                groups.append(group)
+        return groups
+
     def get_preprocessor(self) -> Runnable:
-        def func(functions: List[FunctionMessage]) -> Dict[str, str]:
+        def func(test_codes: List[str]) -> Dict[str, str]:
             unit_test_files = [
-                f"```python\n{f.generated_code}\n```"
-                for f in functions
+                f"```python\n{code}\n```"
+                for code in test_codes
             ]
             unit_test_files = '\n'.join(unit_test_files)
             return {
                 'unit_test_files': unit_test_files,
-                'format_instructions': self.get_output_parser().get_format_instructions()
+                'format_instructions': self.get_format_instructions()
             }
 
         return RunnableLambda(func)
@@ -58,8 +82,8 @@ Make sure to avoid duplication of test cases and ensure the merged file will run
         ])
         return prompt
 
-    def get_output_parser(self) -> PydanticOutputParser:
-        return PydanticOutputParser(pydantic_object=MergedCode)
+    def get_output_schema(self) -> Type[MergedCode]:
+        return MergedCode
 
     def get_postprocessor(self) -> Runnable:
         return RunnableLambda(lambda x: x.merged_code)
@@ -0,0 +1,76 @@
+from typing import Any, Dict, Type
+
+from langchain_core.messages import SystemMessage
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.prompts.chat import HumanMessagePromptTemplate
+from langchain_core.runnables import Runnable, RunnableLambda
+
+from testgen.pipeline.base import BasePipeline
+from testgen.pipeline.fixture import FixturePipeline
+from testgen.pipeline.generate import GeneratedCode
+
+
+class MethodTestsPipeline(BasePipeline):
+    """Generate tests of a batch of class methods against the shared fixture"""
+
+    @staticmethod
+    def test_class_name(class_name: str, index: int) -> str:
+        return f'Test{class_name}{index}' if index else f'Test{class_name}'
+
+    def get_preprocessor(self) -> Runnable:
+        def func(input_data: Dict[str, Any]) -> Dict[str, str]:
+            function = input_data['function']
+            methods = input_data['methods']
+            return {
+                'full_path': function.file_message.id,
+                'class_code': function.content,
+                'class_name': function.name,
+                'fixture_code': input_data['fixture'],
+                'base_class': FixturePipeline.base_class_name(function.name),
+                'test_class': self.test_class_name(function.name, input_data.get('index', 0)),
+                'method_names': ', '.join(f'`{method.name}`' for method in methods),
+                'format_instructions': self.get_format_instructions(),
+            }
+
+        return RunnableLambda(func)
+
+    def get_prompt(self) -> ChatPromptTemplate:
+        system_message = SystemMessage(content="""\
+You are a world-class Python developer with an eagle eye for unintended bugs and edge cases. \
+You write careful, accurate unit tests. \
+When asked to reply only with code, you write all of your code in a single block.\
+""")
+        user_message = HumanMessagePromptTemplate.from_template("""\
+Class `{class_name}` of the Python module with full path {full_path}:
+
+```python
+{class_code}
+```
+
+Test fixture of the class, defined above in the same test module:
+
+```python
+{fixture_code}
+```
+
+Review what the methods {method_names} are doing precisely and which scenarios and edge cases they should handle. \
+Then write a test class `{test_class}` subclassing `{base_class}` with unit tests of these methods \
+covering these scenarios, using the instance and mocks of the fixture. \
+Include helpful comments to explain each line.
+Make sure the generated Python code is compilable.
+**Do not repeat the fixture class, import only what the fixture does not.**
+**Do not include explanation of the code.**
+
+{format_instructions}
+""")
+        prompt = ChatPromptTemplate.from_messages([
+            system_message,
+            user_message
+        ])
+        return prompt
+
+    def get_output_schema(self) -> Type[GeneratedCode]:
+        return GeneratedCode
+
+    def get_postprocessor(self) -> Runnable:
+        return RunnableLambda(lambda x: x.source_code)
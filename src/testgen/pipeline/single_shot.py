@@ -0,0 +1,79 @@
+from typing import Dict, Type
+
+from dependency_injector.wiring import Provide, inject
+from langchain_core.messages import SystemMessage
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.prompts.chat import HumanMessagePromptTemplate
+from langchain_core.runnables import Runnable, RunnableLambda
+
+from testgen.di import DIContainer
+from testgen.models import FunctionMessage
+from testgen.pipeline.base import BasePipeline
+from testgen.pipeline.explain import ExplainPipeline
+from testgen.pipeline.generate import GeneratedCode
+from testgen.service.python import CodeExtractor
+
+
+class SingleShotPipeline(BasePipeline):
+    """Explain, plan and generate unit tests for a simple function in a single model call"""
+
+    @inject
+    def __init__(
+            self,
+            code_extractor: CodeExtractor = Provide[DIContainer.code_extractor],
+            *args,
+            **kwargs
+    ):
+        super().__init__(*args, **kwargs)
+        self.code_extractor = code_extractor
+
+    def get_preprocessor(self) -> Runnable:
+        def func(function: FunctionMessage) -> Dict[str, str]:
+            return {
+                'full_path': function.file_message.id,
+                'imports': self.code_extractor.extract_imports(self.get_source(function)),
+                'function_code': function.content,
+                'context': ExplainPipeline.format_context(function.context),
+                'format_instructions': self.get_format_instructions(),
+            }
+
+        return RunnableLambda(func)
+
+    def get_prompt(self) -> ChatPromptTemplate:
+        system_message = SystemMessage(content="""\
+You are a world-class Python developer with an eagle eye for unintended bugs and edge cases. \
+You write careful, accurate unit tests. \
+When asked to reply only with code, you write all of your code in a single block.\
+""")
+        user_message = HumanMessagePromptTemplate.from_template("""\
+Python module with full path {full_path} has the following imports:
+
+```python
+{imports}
+```
+{context}
+Review the following function of the module: what each element of the function is doing precisely \
+and which scenarios and edge cases it should handle. \
+Then, using Python and the `unittest` package, write a suite of unit tests for the function covering these scenarios. \
+Include helpful comments to explain each line.
+Make sure the generated Python code is compilable.
+**Do not include explanation of the code.**
+**Do not include source code of the function into the test. Use imports.**
+
+```python
+{function_code}
+```
+
+{format_instructions}
+""")
+        prompt = ChatPromptTemplate.from_messages([
+            system_message,
+            user_message
+        ])
+        return prompt
+
+    def get_output_schema(self) -> Type[GeneratedCode]:
+        return GeneratedCode
+
+    def get_postprocessor(self) -> Runnable:
+        return RunnableLambda(lambda x: x.source_code)
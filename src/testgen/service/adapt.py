@@ -0,0 +1,190 @@
+import ast
+import re
+from typing import Dict, List, Optional, Tuple
+
+# (line, start column, end column, replacement) of an identifier in the test code, lines are 1-based
+Edit = Tuple[int, int, int, str]
+
+
+def camel_case(name: str) -> str:
+    """Class-style name of the function, e.g. 'get_user' -> 'GetUser'"""
+    return ''.join(part[:1].upper() + part[1:] for part in name.strip('_').split('_'))
+
+
+def rename_test_name(name: str, renames: Dict[str, str]) -> str:
+    """Rename the tested symbol inside a test function or class name, e.g. 'test_get_empty' or 'TestGet'"""
+    for old, new in renames.items():
+        # snake case segments bounded by underscores, e.g. test_get_user_missing
+        name = re.sub(rf'(?<![^_]){re.escape(old.strip("_"))}(?![^_])', new.strip('_'), name)
+        # camel case words, e.g. TestGetUser
+        name = re.sub(rf'{re.escape(camel_case(old))}(?![a-z0-9])', camel_case(new), name)
+    return name
+
+
+def rename_module(imported: str, source_module: str, target_module: str) -> Optional[str]:
+    """
+    Rename the imported dotted module if it is the source module.
+    Tests may import it by a longer path, e.g. 'src.pkg.mod', or a shorter one, e.g. 'mod'.
+    :return: Renamed module, the unchanged one if it is another module, None if it can not be renamed safely.
+    """
+    if imported == source_module or imported.endswith(f'.{source_module}'):
+        return imported[:len(imported) - len(source_module)] + target_module
+    if source_module.endswith(f'.{imported}'):
+        parts = len(imported.split('.'))
+        source_parts, target_parts = source_module.split('.'), target_module.split('.')
+        if len(target_parts) < parts or source_parts[:-parts] != target_parts[:-parts]:
+            return None
+        return '.'.join(target_parts[-parts:])
+    return imported
+
+
+def is_source_module(imported: str, source_module: str) -> bool:
+    return imported == source_module or imported.endswith(f'.{source_module}') \
+        or source_module.endswith(f'.{imported}')
+
+
+def adapt_test(
+        test_code: str,
+        source_module: str,
+        target_module: str,
+        renames: Dict[str, str],
+        same_file: bool,
+) -> Optional[str]:
+    """
+    Rewrite the test of a function to test a structurally identical one.
+    Only references to the tested symbols are renamed: imports of the source module and its symbols,
+    names bound by these imports, attributes of the imported module, dotted paths in strings,
+    e.g. `mock.patch` targets, and test function and class names derived from the tested symbols.
+
+    :param test_code: Test generated for the source function.
+    :param source_module: Dotted module name of the source function.
+    :param target_module: Dotted module name of the target function.
+    :param renames: Mapping of the source function and class names to the target ones.
+    :param same_file: Both tests are merged into the same test file, so their test names must differ.
+    :return: Adapted test or None if it can not be adapted safely and must be generated instead.
+    """
+    try:
+        tree = ast.parse(test_code)
+    except SyntaxError:
+        return None
+    renames = {old: new for old, new in renames.items() if old != new}
+    lines = test_code.splitlines(keepends=True)
+    edits: List[Edit] = []
+    # local names bound by imports of the source module and its symbols, renamed in every load
+    local_renames: Dict[str, str] = {}
+    # local names of the source module, their attributes naming the tested symbols are renamed
+    module_names = set()
+    # tested symbols the test imports, directly or through the module
+    referenced = set()
+
+    def edit_name(line: int, start: int, old: str, new: str) -> bool:
+        if lines[line - 1][start:start + len(old)] != old:
+            return False
+        edits.append((line, start, start + len(old), new))
+        return True
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            if is_source_module(node.module, source_module):
+                module = rename_module(node.module, source_module, target_module)
+                if module is None:
+                    return None
+                match = re.compile(r'from\s+').match(lines[node.lineno - 1], node.col_offset)
+                if module != node.module and not (match and edit_name(node.lineno, match.end(), node.module, module)):
+                    return None
+                for alias in node.names:
+                    if alias.name not in renames:
+                        referenced.add(alias.name)
+                        continue
+                    if not edit_name(alias.lineno, alias.col_offset, alias.name, renames[alias.name]):
+                        return None
+                    referenced.add(alias.name)
+                    if not alias.asname:
+                        local_renames[alias.name] = renames[alias.name]
+            else:
+                for alias in node.names:
+                    # the module imported from its package, e.g. `from pkg import mod`
+                    if not is_source_module(f'{node.module}.{alias.name}', source_module):
+                        continue
+                    module = rename_module(f'{node.module}.{alias.name}', source_module, target_module)
+                    if module is None or module.rsplit('.', 1)[0] != node.module:
+                        return None
+                    name = module.rsplit('.', 1)[-1]
+                    if name != alias.name:
+                        if not edit_name(alias.lineno, alias.col_offset, alias.name, name):
+                            return None
+                        if not alias.asname:
+                            local_renames[alias.name] = name
+                    module_names.add(alias.asname or alias.name)
+        elif isinstance(node, ast.Import):
+            for alias in node.names:
+                if not is_source_module(alias.name, source_module):
+                    continue
+                module = rename_module(alias.name, source_module, target_module)
+                if module is None or (module != alias.name and not alias.asname and '.' in alias.name):
+                    # references spell the whole dotted path, they are not renamed
+                    return None
+                if module != alias.name:
+                    if not edit_name(alias.lineno, alias.col_offset, alias.name, module):
+                        return None
+                    if not alias.asname:
+                        local_renames[alias.name] = module
+                module_names.add(alias.asname or alias.name)
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load) and node.id in local_renames:
+            edits.append((node.lineno, node.col_offset, node.end_col_offset, local_renames[node.id]))
+        elif isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name) and node.value.id in module_names:
+            referenced.add(node.attr)
+            if node.attr in renames:
+                start = node.end_col_offset - len(node.attr)
+                edits.append((node.end_lineno, start, node.end_col_offset, renames[node.attr]))
+        elif isinstance(node, ast.Constant) and isinstance(node.value, str) and node.lineno == node.end_lineno:
+            value = node.value
+            if not re.fullmatch(r'[\w.]+', value) or not (value == source_module or value.startswith(f'{source_module}.')):
+                continue
+            attributes = [renames.get(part, part) for part in value[len(source_module) + 1:].split('.') if part]
+            renamed = '.'.join([target_module] + attributes)
+            text = lines[node.lineno - 1][node.col_offset:node.end_col_offset]
+            if renamed != value and value in text:
+                start = node.col_offset + text.index(value)
+                edits.append((node.lineno, start, start + len(value), renamed))
+
+    if any(old not in referenced for old in renames):
+        # the test does not import the tested symbol, so its references can not be told apart
+        return None
+
+    existing = {
+        value
+        for node in ast.walk(tree)
+        for value in (getattr(node, attr, None) for attr in ('id', 'name', 'arg', 'attr', 'asname'))
+        if isinstance(value, str)
+    }
+    new_names = set(local_renames.values())
+    test_names = []
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            name = rename_test_name(node.name, renames)
+            test_names.append((node.name, name))
+            if name == node.name:
+                continue
+            keyword = 'class' if isinstance(node, ast.ClassDef) else 'def'
+            match = re.compile(rf'(?:async\s+)?{keyword}\s+').match(lines[node.lineno - 1], node.col_offset)
+            if not match or not edit_name(node.lineno, match.end(), node.name, name):
+                return None
+            new_names.add(name)
+    if new_names & existing:
+        # renamed identifiers would clash with names the test already uses
+        return None
+    if same_file and all(old == new for old, new in test_names if old.lower().startswith('test')):
+        # the adapted test would shadow the original one in the merged test file
+        return None
+    return apply_edits(lines, edits)
+
+
+def apply_edits(lines: List[str], edits: List[Edit]) -> str:
+    """Replace identifier spans of the lines, edits of the same span are applied once"""
+    lines = list(lines)
+    for line, start, end, text in sorted(set(edits), key=lambda e: (e[0], e[1]), reverse=True):
+        lines[line - 1] = lines[line - 1][:start] + text + lines[line - 1][end:]
+    return ''.join(lines)
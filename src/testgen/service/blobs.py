@@ -0,0 +1,57 @@
+import hashlib
+import threading
+from typing import Dict
+
+
+class BlobStore:
+    """
+    Thread-safe, content-addressed store of interned source file content.
+    Function messages reference their file by hash instead of embedding the whole file in every `Send` payload.
+    Function sources and generated tests are small and stay inline in the messages.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._blobs: Dict[str, str] = {}
+        self.hits = 0
+
+    @staticmethod
+    def content_hash(content: str) -> str:
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    def put(self, content: str) -> str:
+        """
+        Store the content once.
+        :return: Hash of the content to resolve it later.
+        """
+        key = self.content_hash(content)
+        with self._lock:
+            if key in self._blobs:
+                self.hits += 1
+            else:
+                self._blobs[key] = content
+        return key
+
+    def get(self, key: str) -> str:
+        try:
+            return self._blobs[key]
+        except KeyError:
+            raise KeyError(f'Blob {key} is not in the store') from None
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._blobs
+
+    def __len__(self) -> int:
+        return len(self._blobs)
+
+    @property
+    def size(self) -> int:
+        """Total size of stored blobs in characters"""
+        with self._lock:
+            return sum(len(blob) for blob in self._blobs.values())
+
+    def clear(self) -> None:
+        with self._lock:
+            self._blobs.clear()
+            self.hits = 0
+
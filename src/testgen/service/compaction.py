@@ -0,0 +1,76 @@
+import logging
+import re
+from typing import List
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+
+from testgen.llm import ChatModel
+from testgen.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+# top-level markdown list item, e.g. "- item", "* item" or "1. item"
+TOP_LEVEL_ITEM = re.compile(r'^\s?(?:[-*+]|\d+[.)])\s+')
+
+
+class HistoryCompactor:
+    """Replace Explain and Plan conversation turns with a bounded, structured digest"""
+
+    def __init__(self, settings: Settings, model: ChatModel):
+        self.settings = settings
+        self.model = model
+
+    def compact(self, function, messages: List[BaseMessage]) -> HumanMessage:
+        """
+        Build digest of the conversation history for the Generate step.
+        :param function: FunctionMessage object under test.
+        :param messages: Explain and Plan conversation history.
+        :return: Single message with the function code, key behaviors and the scenario list.
+        """
+        responses = [m.content for m in messages if isinstance(m, AIMessage)]
+        explanation = responses[0] if responses else ''
+        scenarios = responses[-1] if len(responses) > 1 else ''
+
+        behaviors = [line.strip() for line in explanation.splitlines() if TOP_LEVEL_ITEM.match(line)]
+        scenario_lines = [line.rstrip() for line in scenarios.splitlines() if line.strip()]
+        context = function.context
+
+        max_tokens = self.settings.compaction.max_tokens
+        digest = self.render(function, context, behaviors, scenario_lines)
+        # shrink the least important parts first until the digest fits the ceiling
+        while self.model.count_tokens([digest]) > max_tokens:
+            if context:
+                context = None
+            elif any(line.startswith((' ', '\t')) for line in scenario_lines):
+                # drop scenario examples, keep scenarios themselves
+                scenario_lines = [line for line in scenario_lines if not line.startswith((' ', '\t'))]
+            elif len(behaviors) > 1:
+                behaviors = behaviors[:len(behaviors) // 2]
+            elif len(scenario_lines) > 1:
+                scenario_lines = scenario_lines[:-1]
+            else:
+                logger.warning('Unable to fit digest of %s into %d tokens', function.name, max_tokens)
+                break
+            digest = self.render(function, context, behaviors, scenario_lines)
+        return digest
+
+    @staticmethod
+    def render(function, context, behaviors: List[str], scenarios: List[str]) -> HumanMessage:
+        parts = [f"""\
+Python function under test from the module {function.file_message.id}:
+
+```python
+{function.content}
+```"""]
+        if context:
+            parts.append(f"""\
+Definitions from other modules of the project referenced by the function:
+
+```python
+{context}
+```""")
+        if behaviors:
+            parts.append('Key behaviors of the function:\n' + '\n'.join(behaviors))
+        if scenarios:
+            parts.append('Scenarios to cover:\n' + '\n'.join(scenarios))
+        return HumanMessage(content='\n\n'.join(parts))
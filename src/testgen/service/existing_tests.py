@@ -0,0 +1,268 @@
+import ast
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+
+from testgen.models.code import FunctionDescription
+from testgen.service.index import module_name
+from testgen.service.python import CodeExtractor
+from testgen.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class TestModuleSymbols:
+    """Project symbols exercised by a single test module"""
+    references: Set[str] = field(default_factory=set)
+    """Dotted suffixes (at least two parts) of referenced imported names, e.g. 'module.function'"""
+    attributes: Set[str] = field(default_factory=set)
+    """Names of all accessed attributes, e.g. methods called on instances"""
+    test_names: Set[str] = field(default_factory=set)
+    """Names of test functions and methods"""
+    test_cases: Set[str] = field(default_factory=set)
+    """Names of `TestCase` classes"""
+
+
+class ExistingTestIndex:
+    """Static index of tests in the target folder, to skip functions they already exercise"""
+
+    def __init__(self, settings: Settings, code_extractor: CodeExtractor):
+        self.settings = settings
+        self.code_extractor = code_extractor
+        self.modules: Dict[str, TestModuleSymbols] = {}
+
+    def build(self, files: List) -> None:
+        """
+        Index existing test files.
+        :param files: List of FileMessage objects of the target folder.
+        """
+        self.modules = {}
+        for file in files:
+            try:
+                tree = self.code_extractor.parse(file.content)
+            except SyntaxError as e:
+                logger.warning('Skipping unparsable test file %s: %s', file.id, e)
+                continue
+            self.modules[str(file.id)] = self.index_module(tree)
+        logger.info('Indexed %d existing test files', len(self.modules))
+
+    @staticmethod
+    def index_module(tree: ast.Module) -> TestModuleSymbols:
+        symbols = TestModuleSymbols()
+        imports: Dict[str, str] = {}
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                for alias in node.names:
+                    if alias.asname:
+                        imports[alias.asname] = alias.name
+                    else:
+                        head = alias.name.split('.')[0]
+                        imports[head] = head
+            elif isinstance(node, ast.ImportFrom):
+                # relative imports are matched by the module path suffix
+                for alias in node.names:
+                    imports[alias.asname or alias.name] = f'{node.module}.{alias.name}' if node.module else alias.name
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name.startswith('test'):
+                symbols.test_names.add(node.name)
+            elif isinstance(node, ast.ClassDef):
+                bases = {b.attr if isinstance(b, ast.Attribute) else getattr(b, 'id', None) for b in node.bases}
+                if 'TestCase' in bases or node.name.startswith('Test'):
+                    symbols.test_cases.add(node.name)
+
+        def add(dotted: str) -> None:
+            parts = dotted.split('.')
+            for start in range(len(parts) - 1):
+                symbols.references.add('.'.join(parts[start:]))
+
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Attribute):
+                symbols.attributes.add(node.attr)
+                chain = []
+                current = node
+                while isinstance(current, ast.Attribute):
+                    chain.insert(0, current.attr)
+                    current = current.value
+                if isinstance(current, ast.Name) and current.id in imports:
+                    add('.'.join([imports[current.id]] + chain))
+            elif isinstance(node, ast.Name) and node.id in imports:
+                add(imports[node.id])
+        return symbols
+
+    def is_tested(self, file_id: str, function: FunctionDescription) -> Optional[str]:
+        """
+        Check if any existing test exercises the function.
+        :param file_id: Path of the source file relative to the source folder.
+        :param function: Function or method extracted from the source file.
+        :return: Path of the first test file exercising the function or None.
+        """
+        module = module_name(file_id)
+        tested_name = f'test_{function.name.lstrip("_")}'
+        for test_file, symbols in self.modules.items():
+            named = any(name == tested_name or name.startswith(f'{tested_name}_') for name in symbols.test_names)
+            if function.class_name:
+                if f'{module}.{function.class_name}' not in symbols.references:
+                    continue
+                if function.name in symbols.attributes or named:
+                    return test_file
+            elif f'{module}.{function.name}' in symbols.references:
+                return test_file
+        return None
+
+    def splice(self, existing_code: str, new_code: str, replace: bool = False) -> str:
+        """
+        Add new tests into the existing test module without regenerating it.
+        New imports go after the existing ones, other new top-level statements, e.g. constants, `pytestmark`
+        or patch objects, go before the first definition, methods of existing test classes are added to them,
+        other new classes and functions are appended to the module before its `__main__` block.
+        :param existing_code: Source code of the existing test module.
+        :param new_code: Source code of the generated tests.
+        :param replace: Replace existing tests of the same name, e.g. stale tests of changed functions.
+                        Otherwise, new tests whose names are taken are skipped.
+        :return: Source code of the updated test module.
+        :raise SyntaxError: If either code is not parsable.
+        :raise ValueError: If new top-level statements can not be spliced safely, the modules must be merged instead.
+        """
+        existing = self.code_extractor.parse(existing_code)
+        new = ast.parse(new_code)
+        lines = existing_code.splitlines(keepends=True)
+        if lines and not lines[-1].endswith('\n'):
+            lines[-1] += '\n'
+        new_lines = new_code.splitlines(keepends=True)
+        # insertions before the line index of the existing code and removed line indexes
+        insertions: Dict[int, List[str]] = {}
+        removed: Set[int] = set()
+
+        def segment(node: ast.AST, indent: int = 0) -> List[str]:
+            result = new_lines[self.start_line(node) - 1:node.end_lineno]
+            result = result[:-1] + [result[-1] if result[-1].endswith('\n') else result[-1] + '\n']
+            if indent != node.col_offset:
+                # the method joins a class body indented differently
+                old, new_indent = ' ' * node.col_offset, ' ' * indent
+                result = [new_indent + line[len(old):] if line.startswith(old) else line for line in result]
+            return result
+
+        def replace_node(target: ast.AST, lines_: List[str]) -> None:
+            start = self.start_line(target) - 1
+            removed.update(range(start, target.end_lineno))
+            insertions.setdefault(start, []).extend(lines_)
+
+        existing_imports = {ast.unparse(n) for n in existing.body if isinstance(n, (ast.Import, ast.ImportFrom))}
+        imports = [
+            line for n in new.body
+            if isinstance(n, (ast.Import, ast.ImportFrom)) and ast.unparse(n) not in existing_imports
+            for line in segment(n)
+        ]
+        if imports:
+            insertions.setdefault(self.last_import(existing), []).extend(imports)
+
+        definitions = (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)
+        statements = self.new_statements(existing, new)
+        if statements:
+            # before the first definition, but after the imports the statements may use
+            first = next((self.start_line(n) - 1 for n in existing.body if isinstance(n, definitions)), None)
+            if first is None or first < self.last_import(existing):
+                insertions.setdefault(self.last_import(existing), []).extend(
+                    ['\n'] + [line for n in statements for line in segment(n)])
+            else:
+                insertions.setdefault(first, []).extend(
+                    [line for n in statements for line in segment(n)] + ['\n', '\n'])
+
+        nodes = {n.name: n for n in existing.body if isinstance(n, definitions)}
+        main = next((n for n in existing.body if self.is_main_block(n)), None)
+        end = main.lineno - 1 if main else len(lines)
+        while end > 0 and not lines[end - 1].strip():
+            end -= 1
+        appended = []
+        for node in new.body:
+            if not isinstance(node, definitions):
+                continue
+            target = nodes.get(node.name)
+            if isinstance(node, ast.ClassDef) and isinstance(target, ast.ClassDef):
+                methods = {n.name: n for n in target.body if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef))}
+                indent = target.body[0].col_offset
+                for method in node.body:
+                    if not isinstance(method, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                        continue
+                    if method.name not in methods:
+                        insertions.setdefault(target.end_lineno, []).extend(['\n'] + segment(method, indent))
+                    elif replace:
+                        replace_node(methods[method.name], segment(method, indent))
+            elif target is None:
+                appended.extend(['\n', '\n'] + segment(node))
+            elif replace:
+                replace_node(target, segment(node))
+        if appended:
+            insertions.setdefault(end, []).extend(appended)
+
+        result = []
+        for index in range(len(lines) + 1):
+            result.extend(insertions.get(index, []))
+            if index < len(lines) and index not in removed:
+                result.append(lines[index])
+        return ''.join(result)
+
+    def new_statements(self, existing: ast.Module, new: ast.Module) -> List[ast.stmt]:
+        """
+        Returns top-level statements of the new tests other than imports, definitions and the `__main__` block
+        missing in the existing module.
+        :raise ValueError: If a statement rebinds a name of the existing module or uses a definition,
+                           which is not defined yet before the first definition.
+        """
+        existing_statements = {ast.unparse(n) for n in existing.body}
+        statements = [
+            n for index, n in enumerate(new.body)
+            if not isinstance(n, (ast.Import, ast.ImportFrom, ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef))
+            and not self.is_main_block(n) and not (index == 0 and self.is_docstring(n))
+            and ast.unparse(n) not in existing_statements
+        ]
+        if not statements:
+            return []
+        bound = self.bound_names(existing)
+        defined = {
+            n.name for module in (existing, new) for n in module.body
+            if isinstance(n, (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef))
+        }
+        for statement in statements:
+            names = self.bound_names(ast.Module(body=[statement], type_ignores=[]))
+            if names & bound:
+                raise ValueError(f'Statement rebinds {", ".join(sorted(names & bound))} of the existing tests')
+            loaded = {n.id for n in ast.walk(statement) if isinstance(n, ast.Name) and isinstance(n.ctx, ast.Load)}
+            if loaded & defined:
+                raise ValueError(f'Statement uses {", ".join(sorted(loaded & defined))} defined later')
+        return statements
+
+    @staticmethod
+    def bound_names(module: ast.Module) -> Set[str]:
+        """Names bound by top-level statements of the module"""
+        names = set()
+        for node in module.body:
+            if isinstance(node, (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
+                names.add(node.name)
+            elif isinstance(node, (ast.Import, ast.ImportFrom)):
+                names.update((a.asname or a.name).split('.')[0] for a in node.names)
+            else:
+                names.update(
+                    n.id for n in ast.walk(node) if isinstance(n, ast.Name) and not isinstance(n.ctx, ast.Load))
+        return names
+
+    def last_import(self, module: ast.Module) -> int:
+        """Last line of the imports, or the module docstring if there are no imports"""
+        docstring = module.body[0].end_lineno if module.body and self.is_docstring(module.body[0]) else 0
+        return max(
+            (n.end_lineno for n in module.body if isinstance(n, (ast.Import, ast.ImportFrom))), default=docstring)
+
+    @staticmethod
+    def is_docstring(node: ast.AST) -> bool:
+        return isinstance(node, ast.Expr) and isinstance(node.value, ast.Constant) and isinstance(node.value.value, str)
+
+    @staticmethod
+    def start_line(node: ast.AST) -> int:
+        """First line of the node including decorators"""
+        return min([node.lineno] + [d.lineno for d in getattr(node, 'decorator_list', [])])
+
+    @staticmethod
+    def is_main_block(node: ast.AST) -> bool:
+        """Check if the node is `if __name__ == '__main__':`"""
+        return isinstance(node, ast.If) and isinstance(node.test, ast.Compare) \
+            and isinstance(node.test.left, ast.Name) and node.test.left.id == '__name__'
@@ -0,0 +1,106 @@
+import logging
+import re
+import subprocess
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from testgen.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+# Unified diff hunk header, e.g. "@@ -10,2 +12,3 @@ def foo():"
+HUNK_HEADER = re.compile(r'^@@ -\d+(?:,\d+)? \+(\d+)(?:,(\d+))? @@')
+
+LineRange = Tuple[int, int]
+
+
+class GitDiff:
+    """Local git connector to find source lines changed between two refs"""
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+
+    def changed_lines(
+            self,
+            folder: str,
+            since: Optional[str] = None,
+            diff: Optional[str] = None
+    ) -> Dict[str, List[LineRange]]:
+        """
+        Returns line ranges changed in Python files of the folder.
+        :param folder: Folder relative to the storage folder in settings.
+        :param since: Git ref to compare the working tree with, e.g. 'origin/main'.
+        :param diff: Git range to compare, e.g. 'main..feature'.
+        :return: Mapping of file path (relative to the folder) to the list of changed line ranges.
+        :raise ValueError: If the storage is not a local git working tree.
+        """
+        if bool(since) == bool(diff):
+            raise ValueError('Exactly one of since or diff must be provided')
+        storage_type = self.settings.storage.type
+        if storage_type.name != 'local':
+            # archive and memory storages have no working tree to run git in
+            raise ValueError(f'Git diff mode requires the local storage, not {storage_type.name}')
+        refs = [since] if since else [diff]
+        base_folder = (Path(self.settings.storage_folder) / folder).resolve()
+        if diff:
+            self.check_range_end(diff, base_folder)
+        output = self.run_git(
+            ['diff', '--relative', '--no-prefix', '--no-color', '--no-ext-diff', '-U0', *refs, '--', '*.py'],
+            cwd=base_folder
+        )
+        changes = self.parse_diff(output)
+        logger.info('Found %d changed files in %s', len(changes), base_folder)
+        return changes
+
+    def check_range_end(self, diff: str, cwd: Path) -> None:
+        """
+        Sources are read from the working tree, so hunk line numbers of the range end must match it.
+        :raise ValueError: If the range ends at a commit other than the checkout or the working tree differs from it.
+        """
+        separator = '...' if '...' in diff else '..'
+        end = diff.split(separator, 1)[1] if separator in diff else None
+        if end is None:
+            # a single commit is compared with the working tree
+            return
+        end = end or 'HEAD'
+        head = self.run_git(['rev-parse', 'HEAD'], cwd=cwd).strip()
+        if self.run_git(['rev-parse', f'{end}^{{commit}}'], cwd=cwd).strip() != head:
+            raise ValueError(f"The range '{diff}' must end at the checked out commit, check out '{end}' first")
+        if self.run_git(['diff', '--name-only', end, '--', '*.py'], cwd=cwd).strip():
+            raise ValueError(f"Python files of the working tree differ from '{end}', commit them or use --since")
+
+    @staticmethod
+    def run_git(args: List[str], cwd: Path) -> str:
+        """Run git command and return its standard output"""
+        result = subprocess.run(
+            ['git', *args],
+            cwd=cwd,
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"git {' '.join(args)} failed: {result.stderr.strip()}")
+        return result.stdout
+
+    @staticmethod
+    def parse_diff(output: str) -> Dict[str, List[LineRange]]:
+        """Parse zero-context unified diff into changed line ranges of the new file versions"""
+        changes = {}
+        current = None
+        for line in output.splitlines():
+            if line.startswith('+++ '):
+                path = line[4:].rstrip('\t').strip('"')
+                # deleted files have no functions to generate tests for
+                current = None if path == '/dev/null' else path
+                if current:
+                    changes.setdefault(current, [])
+            elif line.startswith('@@') and current:
+                match = HUNK_HEADER.match(line)
+                if not match:
+                    continue
+                start = int(match.group(1))
+                count = int(match.group(2)) if match.group(2) is not None else 1
+                # pure deletion (count 0) points to the line preceding the removed block
+                end = start + max(count, 1) - 1
+                changes[current].append((start, end))
+        return changes
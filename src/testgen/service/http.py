@@ -0,0 +1,248 @@
+import asyncio
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from testgen.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RequestTiming:
+    """Transport events of a single request, seconds since its start"""
+    start: float
+    connect: Optional[float] = None
+    """Start of a new connection, None if a pooled connection was reused"""
+    send: Optional[float] = None
+    """Start of sending request headers, the connection is acquired by then"""
+    first_byte: Optional[float] = None
+    """End of receiving response headers"""
+
+    def trace(self, event: str, info: Dict[str, Any]) -> None:
+        """httpcore trace extension callback"""
+        now = time.perf_counter() - self.start
+        if event == 'connection.connect_tcp.started':
+            self.connect = now
+        elif event.endswith('.send_request_headers.started') and self.send is None:
+            self.send = now
+        elif event.endswith('.receive_response_headers.complete'):
+            self.first_byte = now
+
+    async def async_trace(self, event: str, info: Dict[str, Any]) -> None:
+        self.trace(event, info)
+
+
+@dataclass
+class HttpMetrics:
+    """Thread-safe transport metrics of the shared HTTP client pool"""
+    max_connections: Optional[int] = None
+    requests: int = 0
+    errors: int = 0
+    new_connections: int = 0
+    reused_connections: int = 0
+    in_flight: int = 0
+    max_in_flight: int = 0
+    saturated: int = 0
+    """Requests started while all connections of the pool were busy"""
+    pool_wait: List[float] = field(default_factory=list)
+    connect_time: List[float] = field(default_factory=list)
+    time_to_first_byte: List[float] = field(default_factory=list)
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def started(self) -> None:
+        with self.lock:
+            if self.max_connections and self.in_flight >= self.max_connections:
+                self.saturated += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def finished(self, timing: RequestTiming, error: bool) -> None:
+        with self.lock:
+            self.in_flight -= 1
+            self.requests += 1
+            if error:
+                self.errors += 1
+            if timing.send is None:
+                return
+            if timing.connect is None:
+                self.reused_connections += 1
+                self.pool_wait.append(timing.send)
+            else:
+                self.new_connections += 1
+                self.pool_wait.append(timing.connect)
+                self.connect_time.append(timing.send - timing.connect)
+            if timing.first_byte is not None:
+                self.time_to_first_byte.append(timing.first_byte - timing.send)
+
+    @staticmethod
+    def percentiles(values: List[float]) -> Dict[str, float]:
+        if not values:
+            return {}
+        values = sorted(values)
+        return {
+            'mean': sum(values) / len(values),
+            'p50': values[len(values) // 2],
+            'p95': values[min(len(values) - 1, int(len(values) * 0.95))],
+            'max': values[-1],
+        }
+
+    def summary(self) -> Dict[str, Any]:
+        with self.lock:
+            connections = self.new_connections + self.reused_connections
+            return {
+                'requests': self.requests,
+                'errors': self.errors,
+                'new_connections': self.new_connections,
+                'connection_reuse': self.reused_connections / connections if connections else 0.0,
+                'max_in_flight': self.max_in_flight,
+                'max_connections': self.max_connections,
+                'saturated_requests': self.saturated,
+                'pool_wait': self.percentiles(self.pool_wait),
+                'connect_time': self.percentiles(self.connect_time),
+                'time_to_first_byte': self.percentiles(self.time_to_first_byte),
+            }
+
+
+class InstrumentedTransport(httpx.HTTPTransport):
+    """Pooled transport recording connection reuse, pool saturation and time to first byte"""
+
+    def __init__(self, metrics: HttpMetrics, **kwargs):
+        super().__init__(**kwargs)
+        self.metrics = metrics
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        timing = RequestTiming(start=time.perf_counter())
+        request.extensions['trace'] = timing.trace
+        self.metrics.started()
+        error = True
+        try:
+            response = super().handle_request(request)
+            error = response.status_code >= 500
+            return response
+        finally:
+            self.metrics.finished(timing, error)
+
+
+class AsyncInstrumentedTransport(httpx.AsyncHTTPTransport):
+    """Async variant of the instrumented transport, the trace extension of async requests must be awaitable"""
+
+    def __init__(self, metrics: HttpMetrics, **kwargs):
+        super().__init__(**kwargs)
+        self.metrics = metrics
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        timing = RequestTiming(start=time.perf_counter())
+        request.extensions['trace'] = timing.async_trace
+        self.metrics.started()
+        error = True
+        try:
+            response = await super().handle_async_request(request)
+            error = response.status_code >= 500
+            return response
+        finally:
+            self.metrics.finished(timing, error)
+
+
+class HttpClientPool:
+    """
+    Shared sync and async HTTP clients of all model clients.
+    Connections are kept alive and reused across the thousands of model calls of a run.
+    """
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self.metrics = HttpMetrics(max_connections=settings.http.max_connections)
+        self._lock = threading.Lock()
+        self._client: Optional[httpx.Client] = None
+        self._async_client: Optional[httpx.AsyncClient] = None
+
+    def transport_params(self) -> Dict[str, Any]:
+        http = self.settings.http
+        http2 = http.http2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning('HTTP/2 requires the h2 package (pip install httpx[http2]), falling back to HTTP/1.1')
+                http2 = False
+        return {
+            'limits': httpx.Limits(
+                max_connections=http.max_connections,
+                max_keepalive_connections=http.max_keepalive_connections,
+                keepalive_expiry=http.keepalive_expiry,
+            ),
+            'http2': http2,
+            'retries': http.connect_retries,
+        }
+
+    def timeout(self) -> httpx.Timeout:
+        http = self.settings.http
+        return httpx.Timeout(
+            connect=http.connect_timeout,
+            read=http.read_timeout,
+            write=http.write_timeout,
+            pool=http.pool_timeout,
+        )
+
+    @property
+    def client(self) -> httpx.Client:
+        with self._lock:
+            if self._client is None:
+                self._client = httpx.Client(
+                    transport=InstrumentedTransport(self.metrics, **self.transport_params()),
+                    timeout=self.timeout(),
+                )
+            return self._client
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        with self._lock:
+            if self._async_client is None:
+                self._async_client = httpx.AsyncClient(
+                    transport=AsyncInstrumentedTransport(self.metrics, **self.transport_params()),
+                    timeout=self.timeout(),
+                )
+            return self._async_client
+
+    def close(self) -> None:
+        """Close pooled connections of both clients, must not be called from a running event loop"""
+        with self._lock:
+            client, self._client = self._client, None
+            async_client, self._async_client = self._async_client, None
+        if client is not None:
+            client.close()
+        if async_client is not None:
+            try:
+                asyncio.run(async_client.aclose())
+            except RuntimeError as e:
+                # e.g. connections bound to another event loop, they are dropped with the process
+                logger.warning('Unable to close async HTTP client: %s', e)
+
+    async def aclose(self) -> None:
+        """Close pooled connections of both clients from the event loop the async client is used in"""
+        with self._lock:
+            client, self._client = self._client, None
+            async_client, self._async_client = self._async_client, None
+        if client is not None:
+            client.close()
+        if async_client is not None:
+            await async_client.aclose()
+
+
+def format_http_summary(summary: Dict[str, Any]) -> str:
+    """Format transport metrics as a single human-readable line"""
+    ttfb = summary['time_to_first_byte']
+    pool_wait = summary['pool_wait']
+    return (
+        f"{summary['requests']} requests ({summary['errors']} errors), "
+        f"{summary['new_connections']} connections opened, {summary['connection_reuse']:.0%} reused, "
+        f"{summary['max_in_flight']} requests in flight at most with {summary['max_connections']} connections, "
+        f"{summary['saturated_requests']} requests waited for a free connection, "
+        f"pool wait p95 {pool_wait.get('p95', 0.0) * 1000:.0f}ms, "
+        f"time to first byte p50 {ttfb.get('p50', 0.0):.2f}s p95 {ttfb.get('p95', 0.0):.2f}s"
+    )
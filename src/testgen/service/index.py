@@ -0,0 +1,247 @@
+import ast
+import copy
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import PurePosixPath
+from typing import Callable, Dict, List, Optional, Tuple
+
+from testgen.models.code import FunctionDescription
+from testgen.service.python import CodeExtractor
+from testgen.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+# how deep re-exports (e.g. names imported into a package `__init__`) are followed
+MAX_REEXPORT_DEPTH = 3
+
+
+@dataclass
+class ModuleSymbols:
+    """Symbols defined and imported by a single module"""
+    stubs: Dict[str, str] = field(default_factory=dict)
+    """Compact stubs of top-level functions and classes by name"""
+    imports: Dict[str, Tuple[str, Optional[str]]] = field(default_factory=dict)
+    """Local name to (module, symbol) mapping, symbol is None for module imports"""
+
+
+def module_name(path: str) -> str:
+    """Convert file path relative to the source folder into dotted module name"""
+    parts = list(PurePosixPath(str(path).replace('\\', '/')).with_suffix('').parts)
+    if parts and parts[-1] == '__init__':
+        parts = parts[:-1]
+    return '.'.join(parts)
+
+
+def module_paths(name: str) -> List[str]:
+    """Candidate file paths of the dotted module name"""
+    base = name.replace('.', '/')
+    return [f'{base}.py', f'{base}/__init__.py']
+
+
+class SymbolIndex:
+    """Project-wide index of module symbols used to give the model compact cross-module context"""
+
+    def __init__(self, settings: Settings, code_extractor: CodeExtractor):
+        self.settings = settings
+        self.code_extractor = code_extractor
+        self._lock = threading.Lock()
+        # recently used module symbols cached by the source code hash, survive between runs
+        self._cache: OrderedDict[str, ModuleSymbols] = OrderedDict()
+        # symbols of modules of the current run by module name
+        self._modules: Dict[str, ModuleSymbols] = {}
+        self._loader: Optional[Callable[[str], Optional[str]]] = None
+        # module names not found in the project (e.g. stdlib or third-party)
+        self._missing = set()
+
+    def build(self, files: List, loader: Optional[Callable[[str], Optional[str]]] = None) -> None:
+        """
+        Index project files.
+        :param files: List of FileMessage objects with paths relative to the source folder.
+        :param loader: Optional callable to read project files missing in the list by relative path.
+        """
+        self._modules = {}
+        self._missing = set()
+        self._loader = loader
+        for file in files:
+            is_package = PurePosixPath(str(file.id)).name == '__init__.py'
+            self.add_module(module_name(file.id), file.content, is_package)
+        logger.info('Indexed %d modules (%d cached)', len(self._modules), len(self._cache))
+
+    def add_module(self, name: str, source_code: str, is_package: bool = False) -> Optional[ModuleSymbols]:
+        # relative imports depend on the module name, so it is a part of the key
+        key = f'{name}:{self.code_extractor.content_hash(source_code)}'
+        with self._lock:
+            symbols = self._cache.get(key)
+            if symbols is not None:
+                self._cache.move_to_end(key)
+        if symbols is None:
+            try:
+                tree = self.code_extractor.parse(source_code)
+            except SyntaxError as e:
+                logger.warning('Unable to index module %s: %s', name, e)
+                return None
+            symbols = self.index_module(tree, name, is_package)
+        with self._lock:
+            self._cache[key] = symbols
+            while len(self._cache) > self.settings.index_cache_size:
+                self._cache.popitem(last=False)
+            self._modules[name] = symbols
+        return symbols
+
+    def get_module(self, name: str) -> Optional[ModuleSymbols]:
+        symbols = self._modules.get(name)
+        if symbols is not None:
+            return symbols
+        if self._loader is None or name in self._missing:
+            return None
+        # lazily index project modules not included into the run (e.g. git-diff mode)
+        for path in module_paths(name):
+            source_code = self._loader(path)
+            if source_code is not None:
+                return self.add_module(name, source_code, path.endswith('__init__.py'))
+        self._missing.add(name)
+        return None
+
+    @classmethod
+    def index_module(cls, tree: ast.Module, name: str, is_package: bool = False) -> ModuleSymbols:
+        symbols = ModuleSymbols()
+        # package `__init__` modules resolve relative imports against themselves
+        package = name if is_package else name.rpartition('.')[0]
+        for node in tree.body:
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                symbols.stubs[node.name] = cls.function_stub(node)
+            elif isinstance(node, ast.ClassDef):
+                symbols.stubs[node.name] = cls.class_stub(node)
+            elif isinstance(node, ast.Import):
+                for alias in node.names:
+                    if alias.asname:
+                        symbols.imports[alias.asname] = (alias.name, None)
+                    else:
+                        top = alias.name.split('.')[0]
+                        symbols.imports[top] = (top, None)
+            elif isinstance(node, ast.ImportFrom):
+                source = cls.resolve_relative(package, node.module, node.level)
+                for alias in node.names:
+                    if alias.name != '*':
+                        symbols.imports[alias.asname or alias.name] = (source, alias.name)
+        return symbols
+
+    @staticmethod
+    def resolve_relative(package: str, module: Optional[str], level: int) -> str:
+        if level == 0:
+            return module or ''
+        parts = package.split('.') if package else []
+        if level > 1:
+            parts = parts[:len(parts) - (level - 1)]
+        if module:
+            parts.append(module)
+        return '.'.join(parts)
+
+    @staticmethod
+    def docstring(node: ast.AST, first_line: bool = False) -> List[ast.stmt]:
+        doc = ast.get_docstring(node)
+        if not doc:
+            return []
+        # keep stubs compact: summary paragraph only, or its first line for methods
+        doc = doc.strip().split('\n\n')[0]
+        if first_line:
+            doc = doc.splitlines()[0]
+        return [ast.Expr(value=ast.Constant(value=doc))]
+
+    @classmethod
+    def function_stub(cls, node: ast.AST, first_line: bool = False) -> str:
+        stub = copy.copy(node)
+        stub.body = cls.docstring(node, first_line) + [ast.Expr(value=ast.Constant(value=Ellipsis))]
+        return ast.unparse(stub)
+
+    @classmethod
+    def class_stub(cls, node: ast.ClassDef) -> str:
+        body = cls.docstring(node)
+        for item in node.body:
+            if isinstance(item, ast.AnnAssign):
+                body.append(item)
+            elif isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)) \
+                    and (not item.name.startswith('_') or item.name == '__init__'):
+                stub = copy.copy(item)
+                stub.body = cls.docstring(item, True) + [ast.Expr(value=ast.Constant(value=Ellipsis))]
+                body.append(stub)
+        stub = copy.copy(node)
+        stub.body = body or [ast.Expr(value=ast.Constant(value=Ellipsis))]
+        return ast.unparse(stub)
+
+    def resolve(self, module: str, symbol: str, depth: int = 0) -> Optional[Tuple[str, str]]:
+        """Find the module defining the symbol following re-exports"""
+        symbols = self.get_module(module)
+        if symbols is None:
+            return None
+        if symbol in symbols.stubs:
+            return module, symbols.stubs[symbol]
+        if depth < MAX_REEXPORT_DEPTH and symbol in symbols.imports:
+            source, name = symbols.imports[symbol]
+            if name is not None:
+                return self.resolve(source, name, depth + 1)
+        return None
+
+    def context_for(self, file, function: FunctionDescription) -> str:
+        """
+        Returns compact stubs of project symbols from other modules referenced by the function.
+        :param file: FileMessage object the function belongs to.
+        :param function: Function description extracted from the file.
+        :return: Python source with stubs grouped by module or an empty string.
+        """
+        name = module_name(file.id)
+        symbols = self.get_module(name)
+        node = self.code_extractor.find_function(file.content, function)
+        if symbols is None or node is None:
+            return ''
+
+        stubs: Dict[str, Dict[str, str]] = {}
+        for reference in self.references(node):
+            head, _, rest = reference.partition('.')
+            if head not in symbols.imports:
+                continue
+            module, symbol = symbols.imports[head]
+            if symbol is None:
+                # `import package.module` referenced as `package.module.Symbol`
+                parts = rest.split('.') if rest else []
+                while len(parts) > 1 and self.get_module(f'{module}.{parts[0]}') is not None:
+                    module = f'{module}.{parts.pop(0)}'
+                if not parts:
+                    continue
+                symbol = parts[0]
+            resolved = self.resolve(module, symbol)
+            if resolved is None:
+                # the symbol may be a submodule imported with `from package import module`
+                if rest and self.get_module(f'{module}.{symbol}') is not None:
+                    resolved = self.resolve(f'{module}.{symbol}', rest.split('.')[0])
+                if resolved is None:
+                    continue
+            source, stub = resolved
+            if source != name:
+                stubs.setdefault(source, {})[stub] = stub
+
+        blocks = [
+            '\n\n'.join([f'# module: {source}', *module_stubs.values()])
+            for source, module_stubs in stubs.items()
+        ]
+        return '\n\n\n'.join(blocks)
+
+    @staticmethod
+    def references(node: ast.AST) -> List[str]:
+        """Collect dotted names (e.g. 'module.Class.method') referenced by the node"""
+        references = []
+        for child in ast.walk(node):
+            if isinstance(child, ast.Attribute):
+                parts = []
+                value = child
+                while isinstance(value, ast.Attribute):
+                    parts.insert(0, value.attr)
+                    value = value.value
+                if isinstance(value, ast.Name):
+                    references.append('.'.join([value.id] + parts))
+            elif isinstance(child, ast.Name):
+                references.append(child.id)
+        # keep order stable while removing duplicates
+        return list(dict.fromkeys(references))
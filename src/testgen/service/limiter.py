@@ -0,0 +1,42 @@
+import logging
+import threading
+from typing import Any, Optional
+
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
+
+from testgen.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+
+class ModelLimiter:
+    """
+    Global budget of concurrent model calls shared by all pipelines.
+    Parallel graph branches may fan out again, e.g. batches of merges or class methods,
+    so calls are limited where they are made instead of per branch.
+    """
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self.limit = settings.concurrency
+        self._semaphore = threading.BoundedSemaphore(self.limit)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def limit_calls(self, runnable: Runnable) -> Runnable:
+        """Wrap the runnable calling the model, so each call waits for a free slot of the budget"""
+
+        def call(value: Any, config: Optional[RunnableConfig] = None) -> Any:
+            with self._semaphore:
+                with self._lock:
+                    self.in_flight += 1
+                    self.max_in_flight = max(self.max_in_flight, self.in_flight)
+                try:
+                    return runnable.invoke(value, config)
+                finally:
+                    with self._lock:
+                        self.in_flight -= 1
+
+        return RunnableLambda(call, name=runnable.get_name())
+
@@ -1,18 +1,102 @@
 import ast
-from typing import List
+import builtins
+import copy
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Union
 
 from testgen.models.code import FunctionDescription
 from testgen.settings import Settings
 
 
+class NameNormalizer(ast.NodeTransformer):
+    """Rename locally bound names into positional placeholders and drop docstrings"""
+
+    def __init__(self, bound: Set[str]):
+        self.bound = bound
+        self.names: Dict[str, str] = {}
+
+    def rename(self, name: str) -> str:
+        if name not in self.bound:
+            return name
+        return self.names.setdefault(name, f'_{len(self.names)}')
+
+    def visit_FunctionDef(self, node: ast.FunctionDef) -> ast.AST:
+        node.name = self.rename(node.name)
+        if ast.get_docstring(node) is not None:
+            node.body = node.body[1:] or [ast.Pass()]
+        return self.generic_visit(node)
+
+    def visit_ClassDef(self, node: ast.ClassDef) -> ast.AST:
+        node.name = self.rename(node.name)
+        if ast.get_docstring(node) is not None:
+            node.body = node.body[1:] or [ast.Pass()]
+        return self.generic_visit(node)
+
+    def visit_arg(self, node: ast.arg) -> ast.AST:
+        node.arg = self.rename(node.arg)
+        return self.generic_visit(node)
+
+    def visit_Name(self, node: ast.Name) -> ast.AST:
+        node.id = self.rename(node.id)
+        return node
+
+    def visit_ExceptHandler(self, node: ast.ExceptHandler) -> ast.AST:
+        if node.name:
+            node.name = self.rename(node.name)
+        return self.generic_visit(node)
+
+
 class CodeExtractor:
     def __init__(self, settings: Settings):
         self.settings = settings
         self.exclude = settings.exclude
+        self._lock = threading.Lock()
+        self._trees: OrderedDict[str, ast.Module] = OrderedDict()
 
-    def extract_functions(self, source_code: str) -> List[FunctionDescription]:
+    @staticmethod
+    def content_hash(source_code: str) -> str:
+        """Returns hash of the source code used as a cache key"""
+        return hashlib.sha256(source_code.encode('utf-8')).hexdigest()
+
+    def parse(self, source_code: str) -> ast.Module:
+        """Parse source code into AST, recently used trees are cached by the source code hash"""
+        key = self.content_hash(source_code)
+        with self._lock:
+            tree = self._trees.get(key)
+            if tree is not None:
+                self._trees.move_to_end(key)
+                return tree
         tree = ast.parse(source_code)
+        with self._lock:
+            self._trees[key] = tree
+            while len(self._trees) > self.settings.parse_cache_size:
+                self._trees.popitem(last=False)
+        return tree
+
+    def clear(self) -> None:
+        """Drop cached trees, e.g. after a run"""
+        with self._lock:
+            self._trees.clear()
+
+    def find_function(self, source_code: str, function: FunctionDescription) -> Optional[ast.AST]:
+        """Find AST node of the function or class previously extracted from the source code"""
+        for node in ast.walk(self.parse(source_code)):
+            if isinstance(node, (ast.FunctionDef, ast.ClassDef)) \
+                    and node.name == function.name and node.end_lineno == function.end_line:
+                return node
+        return None
+
+    def extract_functions(self, source_code: str) -> List[FunctionDescription]:
+        tree = self.parse(source_code)
         source_code_lines = source_code.splitlines(keepends=True)
+        # map methods to their classes
+        classes = {
+            id(child): node
+            for node in ast.walk(tree) if isinstance(node, ast.ClassDef)
+            for child in node.body
+        }
         functions = []
         for node in ast.walk(tree):
             if isinstance(node, ast.FunctionDef):
@@ -25,11 +109,122 @@ class CodeExtractor:
                     )
                     function_description = FunctionDescription(
                         name=node.name,
-                        body=function_source
+                        body=function_source,
+                        start_line=min([node.lineno] + [d.lineno for d in node.decorator_list]),
+                        end_line=node.end_lineno,
+                        class_name=classes[id(node)].name if id(node) in classes else None,
+                        fingerprint=self.fingerprint(node, classes.get(id(node))),
+                        complexity=self.complexity(node),
                     )
                     functions.append(function_description)
         return functions
 
+    def extract_classes(self, source_code: str) -> List[FunctionDescription]:
+        """
+        Returns top-level classes of the module, described as units tested by a single suite.
+        Nested classes and classes defined in functions are implementation details of their owners.
+        """
+        tree = self.parse(source_code)
+        source_code_lines = source_code.splitlines(keepends=True)
+        classes = []
+        for node in tree.body:
+            if isinstance(node, ast.ClassDef):
+                classes.append(FunctionDescription(
+                    name=node.name,
+                    body=self.get_function_source(node, source_code_lines),
+                    start_line=min([node.lineno] + [d.lineno for d in node.decorator_list]),
+                    end_line=node.end_lineno,
+                    class_name=node.name,
+                    fingerprint=self.fingerprint(node),
+                    complexity=self.complexity(node),
+                ))
+        return classes
+
+    @staticmethod
+    def complexity(node: Union[ast.FunctionDef, ast.ClassDef]) -> Dict[str, int]:
+        """Returns complexity metrics of the function or the class: AST size, branches and external calls"""
+        nodes = branches = calls = 0
+        for child in ast.walk(node):
+            nodes += 1
+            if isinstance(child, (ast.If, ast.IfExp, ast.For, ast.AsyncFor, ast.While, ast.Try,
+                                  ast.ExceptHandler, ast.With, ast.AsyncWith, ast.Match, ast.comprehension)):
+                branches += 1
+            elif isinstance(child, ast.BoolOp):
+                branches += len(child.values) - 1
+            elif isinstance(child, ast.Call):
+                # calls of builtins are not considered external
+                func = child.func
+                if not (isinstance(func, ast.Name) and func.id in dir(builtins)):
+                    calls += 1
+        return {
+            'nodes': nodes,
+            'branches': branches,
+            'calls': calls,
+        }
+
+    def extract_imports(self, source_code: str) -> str:
+        """Returns top-level import statements of the module"""
+        tree = self.parse(source_code)
+        return '\n'.join(
+            ast.unparse(node)
+            for node in tree.body
+            if isinstance(node, (ast.Import, ast.ImportFrom))
+        )
+
+    @classmethod
+    def fingerprint(cls, node: Union[ast.FunctionDef, ast.ClassDef], owner: Optional[ast.ClassDef] = None) -> str:
+        """
+        Returns structural fingerprint of the function or the class.
+        Locally bound names, docstrings and formatting are ignored, so renamed copies of the same
+        function share the fingerprint, while functions calling different globals or attributes do not.
+        Method names of a class are its interface called by tests, so only classes with the same methods
+        share the fingerprint. Tests of a method construct its class, so methods of classes constructed
+        differently do not share the fingerprint either.
+        :param node: Function or class node.
+        :param owner: Class the method is defined in, None for functions and classes.
+        """
+        kind = 'class' if isinstance(node, ast.ClassDef) else 'function'
+        dump = cls.structure(node)
+        if owner is not None:
+            kind = 'method'
+            dump = f'{cls.structure(cls.constructor(owner))}:{dump}'
+        return hashlib.sha1(f'{kind}:{dump}'.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def constructor(node: ast.ClassDef) -> ast.ClassDef:
+        """Returns the class reduced to what defines its construction: bases, decorators, fields and constructors"""
+        body = [
+            child for child in node.body
+            if isinstance(child, (ast.AnnAssign, ast.Assign)) or (
+                isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef))
+                and child.name in ('__init__', '__new__', '__post_init__')
+            )
+        ]
+        constructor = copy.copy(node)
+        constructor.body = body or [ast.Pass()]
+        return constructor
+
+    @staticmethod
+    def structure(node: Union[ast.FunctionDef, ast.ClassDef]) -> str:
+        """Returns AST dump of the node with locally bound names normalized"""
+        bound = {node.name}
+        methods = set()
+        if isinstance(node, ast.ClassDef):
+            methods = {id(child) for child in node.body if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef))}
+        for child in ast.walk(node):
+            if isinstance(child, ast.arg):
+                bound.add(child.arg)
+            elif isinstance(child, ast.Name) and not isinstance(child.ctx, ast.Load):
+                bound.add(child.id)
+            elif isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)) and id(child) not in methods:
+                bound.add(child.name)
+            elif isinstance(child, ast.ExceptHandler) and child.name:
+                bound.add(child.name)
+            elif isinstance(child, ast.alias):
+                bound.add(child.asname or child.name.split('.')[0])
+        normalized = NameNormalizer(bound).visit(copy.deepcopy(node))
+        return ast.dump(normalized, annotate_fields=False, include_attributes=False)
+
     @staticmethod
     def get_function_source(node: ast.FunctionDef, source_code_lines: List[str]) -> str:
         """Get the full source code of a function node including decorators"""
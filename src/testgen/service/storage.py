@@ -0,0 +1,338 @@
+import io
+import logging
+import posixpath
+import tarfile
+import threading
+import time
+import zipfile
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from testgen.service.walker import ScanStats, match_paths, walk_files
+from testgen.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+# archive suffixes of the tar format, any other archive is read and written as zip
+TAR_SUFFIXES = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+
+
+def is_tar(path: str) -> bool:
+    return path.lower().endswith(TAR_SUFFIXES)
+
+
+def join_path(folder: Optional[str], path: str = '') -> str:
+    """
+    Join relative posix paths and validate the result does not leave the storage.
+    :return: Normalized path, '' for the storage root.
+    """
+    joined = posixpath.normpath(posixpath.join(folder or '', path))
+    if joined.startswith('/') or joined == '..' or joined.startswith('../'):
+        raise ValueError(f"Access to the path '{joined}' is restricted or invalid.")
+    return '' if joined == '.' else joined
+
+
+class Storage(ABC):
+    """
+    File storage the sources are read from and the tests are written to.
+    Paths are posix paths relative to the storage root.
+    """
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+
+    def list_files(
+            self,
+            folder: Optional[str],
+            include: List[str],
+            exclude: List[str],
+            stats: Optional[ScanStats] = None,
+    ) -> List[Tuple[str, str]]:
+        """
+        Returns files of the folder matching the scan settings.
+        :param folder: Folder relative to the storage root.
+        :param include: Globs of files to return, relative to the folder.
+        :param exclude: Gitignore-style patterns of files and folders to skip, relative to the folder.
+        :param stats: Optional stats object to collect scan statistics.
+        :return: List of (path relative to the folder, content) pairs of matched UTF-8 files.
+        """
+        stats = stats if stats is not None else ScanStats()
+        started = time.perf_counter()
+        base = join_path(folder)
+        prefix = f'{base}/' if base else ''
+        paths = [path[len(prefix):] for path in self.paths() if path.startswith(prefix)]
+        if not paths and base:
+            raise FileNotFoundError(f"The folder '{base}' does not exist or is not a directory.")
+        gitignores = {}
+        if self.settings.scan.use_gitignore:
+            gitignores = self.read_gitignores(base, paths)
+        stats.files = len(paths)
+        stats.directories = len({posixpath.dirname(path) for path in paths})
+        files = []
+        for path in match_paths(paths, include, exclude, gitignores):
+            if self.size(prefix + path) > self.settings.scan.max_file_size:
+                stats.skipped_large += 1
+                continue
+            try:
+                content = self.read_bytes(prefix + path).decode('utf-8')
+            except UnicodeDecodeError:
+                stats.skipped_non_utf8 += 1
+                continue
+            files.append((path, content))
+        stats.matched_files = len(files)
+        stats.elapsed = time.perf_counter() - started
+        return sorted(files)
+
+    def read_gitignores(self, base: str, paths: List[str]) -> Dict[str, List[str]]:
+        """Read .gitignore files of the folder, its subfolders and parents, keyed by folder relative to the folder"""
+        gitignores = {}
+        for path in paths:
+            if posixpath.basename(path) == '.gitignore':
+                gitignores[posixpath.dirname(path)] = self.read_bytes(join_path(base, path)).decode('utf-8').splitlines()
+        # parent patterns are anchored to the parent folder, so only the unanchored ones apply to the folder
+        parent = base
+        while parent:
+            parent = posixpath.dirname(parent)
+            content = self.read_file(join_path(parent, '.gitignore'))
+            if content:
+                patterns = [p for p in content.splitlines() if '/' not in p.rstrip('/')]
+                gitignores[''] = patterns + gitignores.get('', [])
+        return gitignores
+
+    def read_file(self, path: str, folder: Optional[str] = None) -> Optional[str]:
+        """
+        Read a single file.
+        :param path: File path relative to the folder.
+        :param folder: Optional folder relative to the storage root.
+        :return: File content or None if the file does not exist.
+        """
+        path = join_path(folder, path)
+        if not self.exists(path):
+            return None
+        return self.read_bytes(path).decode('utf-8')
+
+    @abstractmethod
+    def write_files(self, files: Dict[str, str], folder: Optional[str] = None) -> None:
+        """
+        Write files into the storage.
+        :param files: Mapping of file path relative to the folder to its content.
+        :param folder: Optional folder relative to the storage root.
+        """
+
+    def close(self) -> None:
+        """Flush buffered writes"""
+
+    @abstractmethod
+    def paths(self) -> Iterable[str]:
+        """Returns paths of all files of the storage"""
+
+    @abstractmethod
+    def exists(self, path: str) -> bool:
+        pass
+
+    @abstractmethod
+    def size(self, path: str) -> int:
+        pass
+
+    @abstractmethod
+    def read_bytes(self, path: str) -> bytes:
+        pass
+
+
+class LocalStorage(Storage):
+    """Storage in the local `storage_folder`"""
+
+    @property
+    def root(self) -> Path:
+        return Path(self.settings.storage_folder).resolve()
+
+    def resolve(self, path: str) -> Path:
+        storage_folder = self.root
+        resolved = (storage_folder / path).resolve()
+        # Ensure the path is within the allowed storage folder
+        if not resolved.is_relative_to(storage_folder):
+            raise ValueError(f"Access to the path '{resolved}' is restricted or invalid.")
+        return resolved
+
+    def list_files(
+            self,
+            folder: Optional[str],
+            include: List[str],
+            exclude: List[str],
+            stats: Optional[ScanStats] = None,
+    ) -> List[Tuple[str, str]]:
+        base_folder = self.resolve(folder or '')
+        # Check if the folder exists and is a directory
+        if not base_folder.exists() or not base_folder.is_dir():
+            raise FileNotFoundError(f"The folder '{base_folder}' does not exist or is not a directory.")
+        scan = self.settings.scan
+        # Walk the folder pruning excluded and ignored folders
+        return [
+            (relative_path.as_posix(), content)
+            for relative_path, content in walk_files(
+                base_folder,
+                include=include,
+                exclude=exclude,
+                max_file_size=scan.max_file_size,
+                use_gitignore=scan.use_gitignore,
+                root_folder=self.root,
+                stats=stats,
+            )
+        ]
+
+    def write_files(self, files: Dict[str, str], folder: Optional[str] = None) -> None:
+        storage_path = self.resolve(folder or '')
+        # Create the directory if it doesn't exist
+        storage_path.mkdir(parents=True, exist_ok=True)
+        logger.debug('Storage path created: %s', storage_path)
+
+        for path, content in files.items():
+            file_path = self.resolve(join_path(folder, path))
+            try:
+                # Make sure the file folder does exist
+                file_path.parent.mkdir(parents=True, exist_ok=True)
+                file_path.write_bytes(content.encode('utf-8'))
+                logger.debug('File written: %s', file_path)
+            except Exception as e:
+                logger.error('Error writing file %s: %s', file_path, e)
+                raise e
+        logger.info('All files have been written to %s', storage_path)
+
+    def paths(self) -> Iterable[str]:
+        root = self.root
+        return (path.relative_to(root).as_posix() for path in root.rglob('*') if path.is_file())
+
+    def exists(self, path: str) -> bool:
+        return self.resolve(path).is_file()
+
+    def size(self, path: str) -> int:
+        return self.resolve(path).stat().st_size
+
+    def read_bytes(self, path: str) -> bytes:
+        return self.resolve(path).read_bytes()
+
+
+class MemoryStorage(Storage):
+    """
+    In-memory storage, e.g. for the service use case where sources arrive with a request.
+    Written files are readable from the same storage.
+    """
+
+    def __init__(self, settings: Settings, files: Optional[Dict[str, Union[str, bytes]]] = None):
+        super().__init__(settings)
+        self.files: Dict[str, bytes] = {}
+        self.lock = threading.Lock()
+        if files:
+            self.write_files(files)
+
+    def write_files(self, files: Dict[str, Union[str, bytes]], folder: Optional[str] = None) -> None:
+        with self.lock:
+            for path, content in files.items():
+                self.files[join_path(folder, path)] = content.encode('utf-8') if isinstance(content, str) else content
+        logger.debug('%d files written to memory', len(files))
+
+    def paths(self) -> Iterable[str]:
+        with self.lock:
+            return list(self.files)
+
+    def exists(self, path: str) -> bool:
+        return path in self.files
+
+    def size(self, path: str) -> int:
+        return len(self.files[path])
+
+    def read_bytes(self, path: str) -> bytes:
+        return self.files[path]
+
+
+class ArchiveStorage(MemoryStorage):
+    """
+    Storage in a tar or zip archive at `storage_folder`.
+    Members are read directly from the archive on demand, written files are buffered in memory
+    and saved as one output archive on close.
+    """
+
+    def __init__(self, settings: Settings):
+        super().__init__(settings)
+        self.archive_path = settings.storage_folder
+        self.archive: Union[tarfile.TarFile, zipfile.ZipFile, None] = None
+        self.members: Dict[str, Union[tarfile.TarInfo, zipfile.ZipInfo]] = {}
+
+    def open(self) -> None:
+        if self.archive is not None:
+            return
+        started = time.perf_counter()
+        if is_tar(self.archive_path):
+            self.archive = tarfile.open(self.archive_path, 'r:*')
+            members = [(m.name, m) for m in self.archive.getmembers() if m.isfile()]
+        else:
+            self.archive = zipfile.ZipFile(self.archive_path)
+            members = [(m.filename, m) for m in self.archive.infolist() if not m.is_dir()]
+        for name, member in members:
+            # members are stored in the archive order, so files are read with sequential access
+            self.members[join_path(name)] = member
+        logger.info('Opened archive %s in %.2fs: %d files', self.archive_path,
+                    time.perf_counter() - started, len(self.members))
+
+    def paths(self) -> Iterable[str]:
+        self.open()
+        return list(self.members) + [path for path in super().paths() if path not in self.members]
+
+    def exists(self, path: str) -> bool:
+        self.open()
+        return super().exists(path) or path in self.members
+
+    def size(self, path: str) -> int:
+        if super().exists(path):
+            return super().size(path)
+        member = self.members[path]
+        return member.size if isinstance(member, tarfile.TarInfo) else member.file_size
+
+    def read_bytes(self, path: str) -> bytes:
+        # written files shadow the input archive members
+        if super().exists(path):
+            return super().read_bytes(path)
+        member = self.members[path]
+        with self.lock:
+            if isinstance(self.archive, tarfile.TarFile):
+                return self.archive.extractfile(member).read()
+            return self.archive.read(member)
+
+    def close(self) -> None:
+        if self.archive is not None:
+            self.archive.close()
+            self.archive = None
+        if not self.files:
+            return
+        output = self.settings.storage.output
+        if not output:
+            raise ValueError('Output archive is not configured, set storage.output in settings')
+        with self.lock:
+            files = dict(sorted(self.files.items()))
+        if is_tar(output):
+            compression = {'.gz': 'gz', '.tgz': 'gz', '.bz2': 'bz2', '.tbz2': 'bz2', '.xz': 'xz', '.txz': 'xz'}
+            mode = compression.get(Path(output).suffix.lower())
+            with tarfile.open(output, f'w:{mode}' if mode else 'w') as archive:
+                for path, content in files.items():
+                    info = tarfile.TarInfo(path)
+                    info.size = len(content)
+                    info.mtime = int(time.time())
+                    archive.addfile(info, io.BytesIO(content))
+        else:
+            with zipfile.ZipFile(output, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+                for path, content in files.items():
+                    archive.writestr(path, content)
+        logger.info('%d files have been written to %s', len(files), output)
+
+
+def create_storage(settings: Settings) -> Storage:
+    """Create the storage backend configured in settings"""
+    storage_type = settings.storage.type
+    if storage_type.name == 'local':
+        return LocalStorage(settings)
+    if storage_type.name == 'archive':
+        return ArchiveStorage(settings)
+    if storage_type.name == 'memory':
+        return MemoryStorage(settings)
+    raise NotImplementedError(f'Unsupported storage type: {storage_type.name}')
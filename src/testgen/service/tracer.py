@@ -0,0 +1,268 @@
+import json
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from testgen.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+# tag of LangGraph internal runnables, e.g. channel writes and branches
+HIDDEN_TAG = 'langsmith:hidden'
+
+
+@dataclass
+class Span:
+    id: UUID
+    parent: Optional[UUID]
+    name: str
+    category: str
+    start: float
+    thread: int
+    args: Dict[str, Any] = field(default_factory=dict)
+    step: Optional[int] = None
+    end: Optional[float] = None
+    queue_wait: float = 0.0
+
+    @property
+    def duration(self) -> float:
+        return (self.end if self.end is not None else self.start) - self.start
+
+
+class ExecutionTracer(BaseCallbackHandler):
+    """
+    Record spans of graph nodes, subgraphs, `Send` branches, pipeline steps and model calls,
+    export them in Chrome trace-event format and compute the critical path of the run.
+    """
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self.origin = time.perf_counter()
+        self.spans: Dict[UUID, Span] = {}
+        # hidden runs are not recorded, their children are attached to the closest recorded ancestor
+        self.hidden: Dict[UUID, Optional[UUID]] = {}
+        self.threads: Dict[int, int] = {}
+        self.lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.settings.trace)
+
+    def now(self) -> float:
+        return time.perf_counter() - self.origin
+
+    @staticmethod
+    def ids(inputs: Any) -> Dict[str, str]:
+        """Function and file ids of the inputs of a node or a pipeline"""
+        function = inputs.get('function') if isinstance(inputs, dict) else inputs
+        file_message = getattr(function, 'file_message', None)
+        if file_message is not None:
+            return {'function': str(function.id), 'file': str(file_message.id)}
+        return {}
+
+    def start_span(
+            self,
+            run_id: UUID,
+            parent_run_id: Optional[UUID],
+            name: str,
+            category: str,
+            tags: Optional[List[str]],
+            metadata: Optional[Dict[str, Any]],
+            args: Dict[str, Any],
+    ) -> None:
+        with self.lock:
+            while parent_run_id in self.hidden:
+                parent_run_id = self.hidden[parent_run_id]
+            if tags and HIDDEN_TAG in tags:
+                self.hidden[run_id] = parent_run_id
+                return
+            thread = self.threads.setdefault(threading.get_ident(), len(self.threads) + 1)
+            metadata = metadata or {}
+            self.spans[run_id] = Span(
+                id=run_id,
+                parent=parent_run_id,
+                name=name,
+                category=category,
+                start=self.now(),
+                thread=thread,
+                args=args,
+                step=metadata.get('langgraph_step') if metadata.get('langgraph_node') == name else None,
+            )
+
+    def end_span(self, run_id: UUID, **args: Any) -> None:
+        with self.lock:
+            span = self.spans.get(run_id)
+            if span is not None:
+                span.end = self.now()
+                span.args.update(args)
+
+    def on_chain_start(self, serialized: Dict[str, Any], inputs: Any, *, run_id: UUID,
+                       parent_run_id: Optional[UUID] = None, tags: Optional[List[str]] = None,
+                       metadata: Optional[Dict[str, Any]] = None, **kwargs: Any) -> None:
+        name = kwargs.get('name') or (serialized or {}).get('name') or 'chain'
+        category = 'node' if (metadata or {}).get('langgraph_node') == name else 'chain'
+        self.start_span(run_id, parent_run_id, name, category, tags, metadata, self.ids(inputs))
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self.end_span(run_id)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self.end_span(run_id, error=f'{type(error).__name__}: {error}')
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[Any]], *, run_id: UUID,
+                            parent_run_id: Optional[UUID] = None, tags: Optional[List[str]] = None,
+                            metadata: Optional[Dict[str, Any]] = None, **kwargs: Any) -> None:
+        name = kwargs.get('name') or (serialized or {}).get('name') or 'model'
+        self.start_span(run_id, parent_run_id, name, 'llm', tags, metadata, {})
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], *, run_id: UUID,
+                     parent_run_id: Optional[UUID] = None, tags: Optional[List[str]] = None,
+                     metadata: Optional[Dict[str, Any]] = None, **kwargs: Any) -> None:
+        name = kwargs.get('name') or (serialized or {}).get('name') or 'model'
+        self.start_span(run_id, parent_run_id, name, 'llm', tags, metadata, {})
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        usage = (response.llm_output or {}).get('token_usage') or {}
+        self.end_span(run_id, **{k: v for k, v in usage.items() if isinstance(v, int)})
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self.end_span(run_id, error=f'{type(error).__name__}: {error}')
+
+    def children(self) -> Dict[Optional[UUID], List[Span]]:
+        children: Dict[Optional[UUID], List[Span]] = {}
+        for span in self.spans.values():
+            if span.end is not None:
+                children.setdefault(span.parent, []).append(span)
+        return children
+
+    def compute_queue_wait(self, children: Dict[Optional[UUID], List[Span]]) -> None:
+        """
+        Queue wait of a graph node is the time from the end of the previous superstep of its graph,
+        when the node became ready, to its start, e.g. waiting for a free concurrency slot.
+        """
+        for parent_id, spans in children.items():
+            parent = self.spans.get(parent_id)
+            steps: Dict[int, float] = {}
+            for span in spans:
+                if span.step is not None:
+                    steps[span.step] = max(steps.get(span.step, 0.0), span.end)
+            for span in spans:
+                if span.step is None:
+                    continue
+                previous = [end for step, end in steps.items() if step < span.step]
+                ready = max(previous) if previous else (parent.start if parent else span.start)
+                span.queue_wait = max(0.0, span.start - ready)
+
+    def critical_path(self, span: Span, children: Dict[Optional[UUID], List[Span]]) -> List[Span]:
+        """Leaf spans of the chain of children ending last, each waiting for the previous one"""
+        spans = children.get(span.id)
+        if not spans:
+            return [span]
+        current = max(spans, key=lambda s: s.end)
+        chain = [current]
+        while True:
+            predecessors = [s for s in spans if s.end <= current.start + 1e-6 and s is not current]
+            if not predecessors:
+                break
+            current = max(predecessors, key=lambda s: s.end)
+            chain.append(current)
+        path = []
+        for item in reversed(chain):
+            path.extend(self.critical_path(item, children))
+        return path
+
+    def summary(self) -> Dict[str, Any]:
+        """Summary of the run: critical path, its breakdown, model concurrency and queue waits"""
+        children = self.children()
+        self.compute_queue_wait(children)
+        roots = children.get(None, [])
+        if not roots:
+            return {'wall_time': 0.0, 'critical_path': []}
+        start = min(s.start for s in roots)
+        end = max(s.end for s in roots)
+        path = []
+        for root in sorted(roots, key=lambda s: s.start):
+            path.extend(self.critical_path(root, children))
+        breakdown: Dict[str, float] = {}
+        for span in path:
+            breakdown[span.name] = breakdown.get(span.name, 0.0) + span.duration
+        model_calls = [s for s in self.spans.values() if s.category == 'llm' and s.end is not None]
+        model_time = sum(s.duration for s in model_calls)
+        nodes = [s for s in self.spans.values() if s.step is not None and s.end is not None]
+        return {
+            'wall_time': end - start,
+            'critical_path_busy': sum(s.duration for s in path),
+            'critical_path_breakdown': dict(sorted(breakdown.items(), key=lambda i: i[1], reverse=True)),
+            'critical_path': [
+                {'name': s.name, 'category': s.category, 'start': s.start - start, 'duration': s.duration, **s.args}
+                for s in path if s.duration > 0
+            ],
+            'model_calls': len(model_calls),
+            'model_time': model_time,
+            'average_model_concurrency': model_time / (end - start) if end > start else 0.0,
+            'queue_wait': sum(s.queue_wait for s in nodes),
+            'max_queue_wait': max((s.queue_wait for s in nodes), default=0.0),
+        }
+
+    def export(self, path: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Write recorded spans as Chrome trace-event JSON viewable in Perfetto or chrome://tracing.
+        :param path: Trace file, defaults to the trace file in settings.
+        :return: Summary of the run, also stored in the `otherData` of the trace.
+        """
+        path = path or self.settings.trace
+        with self.lock:
+            summary = self.summary()
+            events = [
+                {'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': tid, 'args': {'name': f'worker {tid}'}}
+                for tid in self.threads.values()
+            ]
+            for span in sorted(self.spans.values(), key=lambda s: s.start):
+                if span.end is None:
+                    continue
+                args = {**span.args, 'queue_wait_ms': round(span.queue_wait * 1000, 3)} if span.step is not None \
+                    else span.args
+                events.append({
+                    'name': span.name,
+                    'cat': span.category,
+                    'ph': 'X',
+                    'ts': round(span.start * 1e6),
+                    'dur': round(span.duration * 1e6),
+                    'pid': 1,
+                    'tid': span.thread,
+                    'args': args,
+                })
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms', 'otherData': summary}, f, default=str)
+        logger.info('Execution trace with %d spans written to %s', len(events), path)
+        return summary
+
+
+def format_trace_summary(summary: Dict[str, Any], top: int = 10) -> str:
+    """Format the critical path summary as a human-readable report"""
+    wall_time = summary['wall_time']
+    if not wall_time:
+        return 'Nothing traced'
+    lines = [
+        f"Wall time: {wall_time:.1f}s, busy on the critical path: {summary['critical_path_busy']:.1f}s, "
+        f"idle: {max(0.0, wall_time - summary['critical_path_busy']):.1f}s",
+        f"Model calls: {summary['model_calls']}, {summary['model_time']:.1f}s in total, "
+        f"{summary['average_model_concurrency']:.2f} in parallel on average",
+        f"Queue wait of graph nodes: {summary['queue_wait']:.1f}s in total, {summary['max_queue_wait']:.1f}s at most",
+        '',
+        'Critical path by step:',
+        *[f'{duration:>10.1f}s  {name}' for name, duration in list(summary['critical_path_breakdown'].items())[:top]],
+        '',
+        'Longest critical path spans:',
+        *[
+            f"{item['duration']:>10.1f}s  {item['name']} {item.get('function') or item.get('file') or ''}".rstrip()
+            for item in sorted(summary['critical_path'], key=lambda i: i['duration'], reverse=True)[:top]
+        ],
+    ]
+    return '\n'.join(lines)
@@ -0,0 +1,47 @@
+import threading
+from typing import Dict, List, Tuple
+
+
+class FileTracker:
+    """Thread-safe tracker of processed functions per file"""
+
+    def __init__(self, functions: List):
+        """
+        :param functions: List of FunctionMessage objects selected for processing, including duplicates.
+        """
+        self._lock = threading.Lock()
+        self._files: Dict[str, object] = {}
+        self._pending: Dict[str, int] = {}
+        self._completed: Dict[str, List] = {}
+        self._duplicates: Dict[str, List] = {}
+        for function in functions:
+            file_id = function.file_message.key
+            self._files[file_id] = function.file_message
+            self._pending[file_id] = self._pending.get(file_id, 0) + 1
+            self._completed.setdefault(file_id, [])
+            if function.duplicate_of:
+                self._duplicates.setdefault(function.duplicate_of, []).append(function)
+
+    def duplicates(self, function) -> List:
+        """Returns functions reusing the test generated for the function"""
+        return list(self._duplicates.get(function.id, []))
+
+    def complete(self, function) -> List[Tuple[object, List]]:
+        """
+        Mark the function and its duplicates as processed.
+        :return: List of (FileRef, functions) pairs for files whose functions are all processed now.
+        """
+        ready = []
+        with self._lock:
+            for item in [function] + self._duplicates.pop(function.id, []):
+                file_id = item.file_message.key
+                self._completed[file_id].append(item)
+                self._pending[file_id] -= 1
+                if self._pending[file_id] == 0:
+                    ready.append((self._files.pop(file_id), self._completed.pop(file_id)))
+        return ready
+
+    @property
+    def pending_files(self) -> int:
+        with self._lock:
+            return len(self._files)
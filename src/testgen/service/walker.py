@@ -0,0 +1,257 @@
+import logging
+import os
+import re
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def translate_glob(pattern: str) -> str:
+    """Translate gitignore-style glob (with `**`) into regular expression"""
+    result = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith('**/', i):
+            result.append('(?:.*/)?')
+            i += 3
+        elif pattern.startswith('**', i):
+            result.append('.*')
+            i += 2
+        elif pattern[i] == '*':
+            result.append('[^/]*')
+            i += 1
+        elif pattern[i] == '?':
+            result.append('[^/]')
+            i += 1
+        elif pattern[i] == '[' and ']' in pattern[i + 1:]:
+            end = pattern.index(']', i + 1)
+            group = pattern[i + 1:end]
+            if group.startswith('!'):
+                group = '^' + group[1:]
+            result.append(f'[{group}]')
+            i = end + 1
+        elif pattern[i] == '\\' and i + 1 < len(pattern):
+            result.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            result.append(re.escape(pattern[i]))
+            i += 1
+    return ''.join(result)
+
+
+@dataclass
+class IgnoreRule:
+    base: str
+    """Absolute posix path of the folder the rule is defined in"""
+    regex: re.Pattern
+    negate: bool
+    dir_only: bool
+
+    def match(self, path: str, is_dir: bool) -> bool:
+        if self.dir_only and not is_dir:
+            return False
+        if self.base:
+            if not path.startswith(self.base + '/'):
+                return False
+            path = path[len(self.base) + 1:]
+        return self.regex.match(path) is not None
+
+
+class IgnoreRules:
+    """Ordered gitignore-style rules, the last matching rule wins"""
+
+    def __init__(self, rules: Optional[List[IgnoreRule]] = None):
+        self.rules = rules or []
+
+    @staticmethod
+    def parse(patterns: List[str], base: str = '') -> List[IgnoreRule]:
+        rules = []
+        for line in patterns:
+            line = line.rstrip('\n').rstrip()
+            if not line or line.startswith('#'):
+                continue
+            negate = line.startswith('!')
+            if negate:
+                line = line[1:]
+            elif line.startswith('\\'):
+                line = line[1:]
+            dir_only = line.endswith('/')
+            line = line.rstrip('/')
+            # patterns with a slash are relative to the folder, others match at any depth
+            anchored = '/' in line
+            line = line.lstrip('/')
+            prefix = '' if anchored else '(?:.*/)?'
+            regex = re.compile(f'^{prefix}{translate_glob(line)}$')
+            rules.append(IgnoreRule(base=base, regex=regex, negate=negate, dir_only=dir_only))
+        return rules
+
+    def extend(self, rules: List[IgnoreRule]) -> 'IgnoreRules':
+        """Returns new rule set with additional rules, e.g. of a nested .gitignore"""
+        return IgnoreRules(self.rules + rules)
+
+    def is_ignored(self, path: str, is_dir: bool) -> bool:
+        ignored = False
+        for rule in self.rules:
+            if rule.match(path, is_dir):
+                ignored = not rule.negate
+        return ignored
+
+
+@dataclass
+class ScanStats:
+    directories: int = 0
+    pruned_directories: int = 0
+    files: int = 0
+    matched_files: int = 0
+    skipped_large: int = 0
+    skipped_non_utf8: int = 0
+    elapsed: float = 0.0
+
+
+def read_gitignore(folder: Path) -> List[IgnoreRule]:
+    gitignore = folder / '.gitignore'
+    try:
+        patterns = gitignore.read_text(encoding='utf-8').splitlines()
+    except (OSError, UnicodeDecodeError):
+        return []
+    return IgnoreRules.parse(patterns, base=folder.as_posix())
+
+
+def read_parent_gitignores(base_folder: Path, root_folder: Path) -> IgnoreRules:
+    """Returns rules of .gitignore files of parents of the folder up to the root folder"""
+    rules = IgnoreRules()
+    parent = base_folder.parent
+    parents = []
+    while parent.is_relative_to(root_folder):
+        parents.insert(0, parent)
+        if parent == root_folder:
+            break
+        parent = parent.parent
+    # outer .gitignore files first, so inner ones take precedence
+    for parent in parents:
+        rules = rules.extend(read_gitignore(parent))
+    return rules
+
+
+def walk_files(
+        base_folder: Path,
+        include: List[str],
+        exclude: List[str],
+        max_file_size: int,
+        use_gitignore: bool = True,
+        root_folder: Optional[Path] = None,
+        stats: Optional[ScanStats] = None,
+) -> Iterator[Tuple[Path, str]]:
+    """
+    Walk the folder with `os.scandir` pruning excluded and ignored directories early.
+
+    :param base_folder: Absolute folder to walk.
+    :param include: Globs of files to return, relative to the base folder.
+    :param exclude: Gitignore-style patterns of files and folders to skip, relative to the base folder.
+    :param max_file_size: Files larger than this number of bytes are skipped.
+    :param use_gitignore: Respect .gitignore files of the base folder, its subfolders and parents up to root folder.
+    :param root_folder: Topmost folder to look for .gitignore files in.
+    :param stats: Optional stats object to collect scan statistics.
+    :return: Iterator of (relative path, content) pairs of matched UTF-8 files.
+    """
+    stats = stats if stats is not None else ScanStats()
+    started = time.perf_counter()
+    base = base_folder.as_posix()
+    include_regex = [re.compile(f'^{translate_glob(pattern.lstrip("/"))}$') for pattern in include]
+    # configured excludes always apply, .gitignore negations can not re-include them
+    exclude_rules = IgnoreRules(IgnoreRules.parse(exclude, base=base))
+    rules = IgnoreRules()
+    if use_gitignore and root_folder is not None:
+        rules = read_parent_gitignores(base_folder, root_folder)
+
+    stack = [(base_folder, rules)]
+    while stack:
+        folder, folder_rules = stack.pop()
+        stats.directories += 1
+        if use_gitignore:
+            folder_rules = folder_rules.extend(read_gitignore(folder))
+        try:
+            entries = list(os.scandir(folder))
+        except OSError as e:
+            logger.warning('Unable to scan %s: %s', folder, e)
+            continue
+        subfolders = []
+        for entry in sorted(entries, key=lambda e: e.name):
+            path = Path(entry.path)
+            posix_path = path.as_posix()
+            if entry.is_dir(follow_symlinks=False):
+                if exclude_rules.is_ignored(posix_path, is_dir=True) \
+                        or folder_rules.is_ignored(posix_path, is_dir=True):
+                    stats.pruned_directories += 1
+                else:
+                    subfolders.append((path, folder_rules))
+                continue
+            if not entry.is_file():
+                continue
+            stats.files += 1
+            relative = posix_path[len(base) + 1:]
+            if not any(regex.match(relative) for regex in include_regex):
+                continue
+            if exclude_rules.is_ignored(posix_path, is_dir=False) \
+                    or folder_rules.is_ignored(posix_path, is_dir=False):
+                continue
+            if entry.stat().st_size > max_file_size:
+                stats.skipped_large += 1
+                continue
+            try:
+                content = path.read_bytes().decode('utf-8')
+            except UnicodeDecodeError:
+                stats.skipped_non_utf8 += 1
+                continue
+            stats.matched_files += 1
+            yield Path(relative), content
+        # keep the alphabetical order of the walk
+        stack.extend(reversed(subfolders))
+    stats.elapsed = time.perf_counter() - started
+
+
+def match_paths(
+        paths: List[str],
+        include: List[str],
+        exclude: List[str],
+        gitignores: Optional[Dict[str, List[str]]] = None,
+) -> List[str]:
+    """
+    Select paths of files that are not stored in a file system, e.g. archive members.
+
+    :param paths: Relative posix paths of files.
+    :param include: Globs of files to select.
+    :param exclude: Gitignore-style patterns of files and folders to skip.
+    :param gitignores: Optional mapping of relative folder ('' for the root) to its .gitignore patterns.
+    :return: Selected paths.
+    """
+    include_regex = [re.compile(f'^{translate_glob(pattern.lstrip("/"))}$') for pattern in include]
+    exclude_rules = IgnoreRules(IgnoreRules.parse(exclude))
+    rules = IgnoreRules()
+    # outer .gitignore files first, so inner ones take precedence
+    for folder in sorted(gitignores or {}, key=lambda f: (f.count('/'), f) if f else (-1, f)):
+        rules = rules.extend(IgnoreRules.parse(gitignores[folder], base=folder))
+
+    ignored_folders: Dict[str, bool] = {'': False}
+
+    def is_folder_ignored(folder: str) -> bool:
+        if folder not in ignored_folders:
+            parent = folder.rpartition('/')[0]
+            ignored_folders[folder] = is_folder_ignored(parent) \
+                or exclude_rules.is_ignored(folder, is_dir=True) \
+                or rules.is_ignored(folder, is_dir=True)
+        return ignored_folders[folder]
+
+    selected = []
+    for path in paths:
+        if not any(regex.match(path) for regex in include_regex):
+            continue
+        if is_folder_ignored(path.rpartition('/')[0]):
+            continue
+        if exclude_rules.is_ignored(path, is_dir=False) or rules.is_ignored(path, is_dir=False):
+            continue
+        selected.append(path)
+    return selected
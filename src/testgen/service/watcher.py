@@ -0,0 +1,231 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import sys
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from testgen.service.walker import IgnoreRules, match_paths, read_gitignore, read_parent_gitignores
+from testgen.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+# inotify(7) constants
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+EVENT_HEADER = struct.Struct('iIII')
+
+
+class FileWatcher(ABC):
+    """
+    Watch the folder for changes of files matching include and exclude patterns.
+    Files and folders ignored by .gitignore files are skipped the same way the folder is scanned.
+    Paths are reported relative to the folder.
+    """
+
+    def __init__(
+            self,
+            folder: Path,
+            include: List[str],
+            exclude: List[str],
+            use_gitignore: bool = True,
+            root_folder: Optional[Path] = None,
+    ):
+        self.folder = folder
+        self.include = include
+        self.exclude = exclude
+        self.exclude_rules = IgnoreRules(IgnoreRules.parse(exclude, base=folder.as_posix()))
+        self.use_gitignore = use_gitignore
+        self.root_folder = root_folder
+        self.gitignores: Dict[Path, IgnoreRules] = {}
+
+    def gitignore_rules(self, folder: Path) -> IgnoreRules:
+        """Gitignore rules applying to entries of the watched folder or its subfolder"""
+        if not self.use_gitignore:
+            return IgnoreRules()
+        if folder not in self.gitignores:
+            if folder == self.folder:
+                parents = read_parent_gitignores(folder, self.root_folder) if self.root_folder else IgnoreRules()
+            else:
+                parents = self.gitignore_rules(folder.parent)
+            self.gitignores[folder] = parents.extend(read_gitignore(folder))
+        return self.gitignores[folder]
+
+    def is_ignored(self, path: Path, is_dir: bool) -> bool:
+        posix_path = path.as_posix()
+        return self.exclude_rules.is_ignored(posix_path, is_dir=is_dir) \
+            or self.gitignore_rules(path.parent).is_ignored(posix_path, is_dir=is_dir)
+
+    def folders(self, start: Optional[Path] = None) -> Iterator[Path]:
+        """Walk not excluded and not ignored folders of the watched folder or its subfolder"""
+        for root, dirs, _ in os.walk(start or self.folder):
+            dirs[:] = [d for d in dirs if not self.is_ignored(Path(root) / d, is_dir=True)]
+            yield Path(root)
+
+    def select(self, paths: Set[str]) -> Set[str]:
+        if any(Path(path).name == '.gitignore' for path in paths):
+            # rules changed, they are read again on demand
+            self.gitignores.clear()
+        selected = set()
+        for path in match_paths(sorted(paths), self.include, self.exclude):
+            relative = Path(path)
+            folders = [self.folder / parent for parent in relative.parents if parent != Path('.')]
+            if self.is_ignored(self.folder / relative, is_dir=False) \
+                    or any(self.is_ignored(folder, is_dir=True) for folder in folders):
+                continue
+            selected.add(path)
+        return selected
+
+    @abstractmethod
+    def poll(self, timeout: float) -> Set[str]:
+        """Wait up to timeout seconds and return paths changed since the previous call"""
+
+    def changes(self, debounce: float) -> Iterator[Set[str]]:
+        """Yield changed paths after a burst of changes is followed by debounce seconds of quiet"""
+        while True:
+            changed = self.poll(timeout=1.0)
+            if not changed:
+                continue
+            while True:
+                more = self.poll(timeout=debounce)
+                if not more:
+                    break
+                changed |= more
+            yield changed
+
+    def close(self) -> None:
+        pass
+
+
+class PollingWatcher(FileWatcher):
+    """Portable watcher comparing modification times and sizes of files"""
+
+    def __init__(self, folder: Path, include: List[str], exclude: List[str], interval: float, **kwargs):
+        super().__init__(folder, include, exclude, **kwargs)
+        self.interval = interval
+        self.snapshot = self.stat_files()
+
+    def stat_files(self) -> Dict[str, Tuple[int, int]]:
+        stats = {}
+        base = len(self.folder.as_posix()) + 1
+        for folder in self.folders():
+            try:
+                entries = list(os.scandir(folder))
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.is_file(follow_symlinks=False):
+                    stat = entry.stat()
+                    stats[Path(entry.path).as_posix()[base:]] = (stat.st_mtime_ns, stat.st_size)
+        return stats
+
+    def poll(self, timeout: float) -> Set[str]:
+        time.sleep(min(timeout, self.interval))
+        snapshot = self.stat_files()
+        changed = {path for path, stat in snapshot.items() if self.snapshot.get(path) != stat}
+        changed |= self.snapshot.keys() - snapshot.keys()
+        self.snapshot = snapshot
+        return self.select(changed)
+
+
+class InotifyWatcher(FileWatcher):
+    """Linux inotify watcher, one watch per not excluded folder"""
+
+    def __init__(self, folder: Path, include: List[str], exclude: List[str], **kwargs):
+        super().__init__(folder, include, exclude, **kwargs)
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.watches: Dict[int, Path] = {}
+        for path in self.folders():
+            self.add_watch(path)
+
+    def add_watch(self, path: Path) -> None:
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            # e.g. fs.inotify.max_user_watches is exhausted
+            raise OSError(ctypes.get_errno(), f'inotify_add_watch failed for {path}')
+        self.watches[wd] = path
+
+    def poll(self, timeout: float) -> Set[str]:
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+        changed = set()
+        data = os.read(self.fd, 1 << 16)
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                logger.warning('Watch event queue overflow, rescanning %s', self.folder)
+                return self.select(self.all_files())
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+            folder = self.watches.get(wd)
+            if folder is None or not name:
+                continue
+            path = folder / name
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and not self.is_ignored(path, is_dir=True):
+                    # files can be created before the new folder is watched, so report them too
+                    for subfolder in self.folders(path):
+                        self.add_watch(subfolder)
+                        changed |= {(subfolder / f).relative_to(self.folder).as_posix()
+                                    for f in os.listdir(subfolder) if (subfolder / f).is_file()}
+                continue
+            changed.add(path.relative_to(self.folder).as_posix())
+        return self.select(changed)
+
+    def all_files(self) -> Set[str]:
+        return {
+            (folder / name).relative_to(self.folder).as_posix()
+            for folder in self.folders() for name in os.listdir(folder) if (folder / name).is_file()
+        }
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+def create_watcher(
+        folder: Path,
+        settings: Settings,
+        exclude: Optional[List[str]] = None,
+        root_folder: Optional[Path] = None,
+) -> FileWatcher:
+    """
+    Create inotify watcher on Linux, or polling watcher if inotify is disabled or not available.
+    :param folder: Absolute folder to watch.
+    :param settings: Settings with scan and watch configuration.
+    :param exclude: Additional patterns of files and folders to skip, relative to the folder.
+    :param root_folder: Topmost folder to look for .gitignore files in, e.g. the storage folder.
+    """
+    scan = settings.scan
+    include, exclude = scan.include, scan.exclude + (exclude or [])
+    params = {'use_gitignore': scan.use_gitignore, 'root_folder': root_folder}
+    if settings.watch.use_inotify and sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(folder, include, exclude, **params)
+        except (OSError, AttributeError) as e:
+            logger.warning('inotify is not available, falling back to polling: %s', e)
+    return PollingWatcher(folder, include, exclude, interval=settings.watch.poll_interval, **params)
@@ -2,7 +2,7 @@ import logging
 import os
 from enum import Enum
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 
 from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -25,12 +25,138 @@ class ModelType(Enum):
 class ModelSettings(BaseSettings):
     type: ModelType = Field(description='LLM type')
     params: Dict[str, Any] = Field(default_factory=dict, description='LLM parameters')
+    structured_output: Optional[bool] = Field(
+        default=None,
+        description='Use native JSON schema output of the model, enabled by default unless a custom base_url is set, '
+                    'since OpenAI-compatible servers may not support it')
+    parse_retries: int = Field(
+        default=1, description='Number of paid model retries when the output can not be parsed or repaired')
+    input_price: float = Field(default=0.0, description='Price of 1M input tokens, USD')
+    output_price: float = Field(default=0.0, description='Price of 1M output tokens, USD')
+
+
+class RateLimitSettings(BaseSettings):
+    requests_per_minute: Optional[float] = Field(default=None, description='Maximal number of model requests per minute')
+    tokens_per_minute: Optional[int] = Field(
+        default=None, description='Token budget per minute of the model account, used for estimates')
+
+
+class HttpSettings(BaseSettings):
+    max_connections: int = Field(default=64, description='Maximal number of open connections to the model API')
+    max_keepalive_connections: int = Field(
+        default=32, description='Maximal number of idle connections kept alive for reuse')
+    keepalive_expiry: float = Field(default=60.0, description='Seconds an idle connection is kept alive')
+    http2: bool = Field(
+        default=False, description='Multiplex requests over HTTP/2 connections, requires the h2 package')
+    connect_timeout: float = Field(default=10.0, description='Timeout of establishing a connection, seconds')
+    read_timeout: float = Field(
+        default=300.0, description='Timeout of waiting for response data, seconds, long generations are slow')
+    write_timeout: float = Field(default=30.0, description='Timeout of sending the request, seconds')
+    pool_timeout: float = Field(default=60.0, description='Timeout of waiting for a free connection, seconds')
+    connect_retries: int = Field(default=1, description='Number of retries of failed connection attempts')
+
+
+class EstimateSettings(BaseSettings):
+    output_tokens: Dict[str, int] = Field(
+        default_factory=lambda: {
+            'explain': 700, 'plan': 600, 'generate': 900, 'single_shot': 900, 'fixture': 500, 'method_tests': 1200,
+        },
+        description='Expected number of output tokens per pipeline call')
+    tokens_per_second: float = Field(default=60.0, description='Expected model output speed, tokens per second')
+    request_latency: float = Field(default=1.0, description='Expected model latency before the first token, seconds')
+
+
+class CompactionSettings(BaseSettings):
+    enabled: bool = Field(default=True, description='Compact conversation history before the Generate step')
+    max_tokens: int = Field(default=2000, description='Token ceiling of the compacted history')
+
+
+class RoutingSettings(BaseSettings):
+    enabled: bool = Field(default=True, description='Generate tests for simple functions in a single model call')
+    max_nodes: int = Field(default=80, description='Maximal AST size of a simple function')
+    max_branches: int = Field(default=2, description='Maximal number of branches of a simple function')
+    max_calls: int = Field(default=3, description='Maximal number of external calls of a simple function')
+
+
+class ClassSuiteSettings(BaseSettings):
+    enabled: bool = Field(
+        default=False, description='Generate one suite with a shared fixture per class instead of a suite per method')
+    min_methods: int = Field(default=2, description='Classes with fewer methods to test are processed per method')
+    methods_per_call: int = Field(default=6, description='Maximal number of methods tested by a single model call')
+
+
+class MergeSettings(BaseSettings):
+    max_input_tokens: int = Field(
+        default=6000, description='Token budget of test snippets merged by a single model call')
+
+
+class ScanSettings(BaseSettings):
+    include: List[str] = Field(default=['**/*.py'], description='Globs of source files to scan')
+    exclude: List[str] = Field(
+        default=[
+            '.git/', '.hg/', '.svn/', 'venv/', '.venv/', 'node_modules/', '__pycache__/', 'build/', 'dist/',
+            '*.egg-info/', '.tox/', '.nox/', '.mypy_cache/', '.pytest_cache/', '.ruff_cache/',
+        ],
+        description='Gitignore-style patterns of files and folders to skip')
+    max_file_size: int = Field(default=1_000_000, description='Source files larger than this number of bytes are skipped')
+    use_gitignore: bool = Field(default=True, description='Skip files and folders ignored by .gitignore files')
+
+
+class WatchSettings(BaseSettings):
+    debounce: float = Field(
+        default=0.5, description='Seconds of quiet after a burst of saves before the changed files are processed')
+    use_inotify: bool = Field(default=True, description='Use inotify on Linux instead of polling')
+    poll_interval: float = Field(default=1.0, description='Seconds between polls of the polling watcher')
+
+
+class StorageType(Enum):
+    local = 'local'
+    archive = 'archive'
+    memory = 'memory'
+
+
+class StorageSettings(BaseSettings):
+    type: StorageType = Field(
+        default=StorageType.local,
+        description='Storage backend: local folder, tar/zip archive at storage_folder or in-memory store')
+    output: Optional[str] = Field(
+        default=None, description='Output tar/zip archive written files are saved to, for the archive storage')
 
 
 class Settings(YamlBaseSettings):
-    storage_folder: str
+    storage_folder: str = Field(description='Storage folder, or the input archive for the archive storage')
     exclude: List[str] = Field(default='__init__', description='List of function names to exclude from analysis')
     model: ModelSettings = Field(description='LLM model settings')
+    failure_report: str = Field(
+        default='failures.json', description='Report of functions failed in the last run, relative to the storage')
+    deduplicate: bool = Field(
+        default=True, description='Generate tests once for structurally identical functions and reuse them')
+    skip_tested: bool = Field(
+        default=True, description='Skip functions already exercised by existing tests of the target folder')
+    parse_cache_size: int = Field(
+        default=256, description='Maximal number of parsed source files kept in memory for reuse')
+    index_cache_size: int = Field(
+        default=4096, description='Maximal number of indexed module symbols kept in memory for reuse between runs')
+    cross_module_context: bool = Field(
+        default=True, description='Add stubs of symbols referenced from other project modules to prompts')
+    storage: StorageSettings = Field(default_factory=StorageSettings, description='Storage backend settings')
+    scan: ScanSettings = Field(default_factory=ScanSettings, description='Source folder scan settings')
+    trace: Optional[str] = Field(
+        default=None, description='Write Chrome trace-event JSON of the run with its critical path into the file')
+    watch: WatchSettings = Field(default_factory=WatchSettings, description='Watch mode settings')
+    concurrency: int = Field(default=8, description='Maximal number of functions processed in parallel')
+    rate_limit: RateLimitSettings = Field(
+        default_factory=RateLimitSettings, description='Model rate limit settings')
+    http: HttpSettings = Field(default_factory=HttpSettings, description='HTTP connection pool settings of the model API')
+    estimate: EstimateSettings = Field(
+        default_factory=EstimateSettings, description='Dry-run cost and duration estimate settings')
+    routing: RoutingSettings = Field(
+        default_factory=RoutingSettings, description='Adaptive pipeline depth settings')
+    class_suites: ClassSuiteSettings = Field(
+        default_factory=ClassSuiteSettings, description='Class-level suite generation settings')
+    merge: MergeSettings = Field(default_factory=MergeSettings, description='Test file merge settings')
+    compaction: CompactionSettings = Field(
+        default_factory=CompactionSettings, description='Conversation history compaction settings')
 
     # configure paths to secrets directory and YAML config file
     model_config = SettingsConfigDict(
@@ -1,6 +1,11 @@
-from testgen.tools.storage import list_files, write_files
+from testgen.tools.report import read_failure_report, write_failure_report
+from testgen.tools.storage import list_files, read_file, read_files, write_files
 
 __all__ = [
     'list_files',
+    'read_failure_report',
+    'read_file',
+    'read_files',
+    'write_failure_report',
     'write_files',
 ]
@@ -0,0 +1,65 @@
+import json
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from dependency_injector.wiring import Provide, inject
+from langchain_core.messages.base import BaseMessage
+
+from testgen.di import DIContainer
+from testgen.models import FileMessage
+from testgen.settings import Settings
+from testgen.tools.storage import read_file, write_files
+
+logger = logging.getLogger(__name__)
+
+
+@inject
+def write_failure_report(
+        failures: List[BaseMessage],
+        settings: Settings = Provide[DIContainer.settings]
+) -> None:
+    """
+    Write the report of functions failed to process into the file storage.
+    The report is rewritten on every run, so it always lists failures of the last run only.
+
+    :param failures: List of failed FunctionMessage objects.
+    :param settings: Settings object provided by DI containing storage configuration.
+    """
+    report = [
+        {
+            'root': function.file_message.root,
+            'file': function.file_message.id,
+            'function': function.name,
+            'start_line': function.description.start_line,
+            'end_line': function.description.end_line,
+            'error': function.error,
+        }
+        for function in failures
+    ]
+    write_files(files=[FileMessage(id=settings.failure_report, content=json.dumps(report, indent=2))])
+    if report:
+        logger.warning('%d functions failed, see %s', len(report), settings.failure_report)
+
+
+@inject
+def read_failure_report(
+        source_folder: Optional[str] = None,
+        settings: Settings = Provide[DIContainer.settings]
+) -> Dict[str, List[Tuple[int, int]]]:
+    """
+    Read the report of functions failed in the last run.
+
+    :param source_folder: Source folder of a multi-root run to read failures of, all failures by default.
+    :param settings: Settings object provided by DI containing storage configuration.
+    :return: Mapping of file path to line ranges of the failed functions.
+    """
+    content = read_file(settings.failure_report)
+    if not content:
+        return {}
+    changes = {}
+    for failure in json.loads(content):
+        # reports written before multi-root runs have no root
+        if source_folder and failure.get('root') not in (None, source_folder):
+            continue
+        changes.setdefault(failure['file'], []).append((failure['start_line'], failure['end_line']))
+    return changes
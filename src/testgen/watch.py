@@ -0,0 +1,132 @@
+import logging
+import time
+from typing import Dict, List, Tuple
+
+from dependency_injector.wiring import Provide, inject
+
+from testgen.di import DIContainer
+from testgen.graph.generator import GeneratorGraph
+from testgen.graph.scanner import ScannerGraph
+from testgen.models import FileMessage
+from testgen.service.blobs import BlobStore
+from testgen.service.python import CodeExtractor
+from testgen.service.storage import LocalStorage, Storage
+from testgen.service.watcher import create_watcher
+from testgen.settings import Settings
+from testgen.tools import list_files, read_file, write_failure_report
+
+logger = logging.getLogger(__name__)
+
+
+class FunctionSnapshot:
+    """Source hashes of functions of the watched files, to find functions added or modified by a save"""
+
+    def __init__(self, code_extractor: CodeExtractor):
+        self.code_extractor = code_extractor
+        self.files: Dict[str, Dict[str, str]] = {}
+
+    def update(self, file_id: str, content: str) -> List[Tuple[int, int]]:
+        """
+        Replace the snapshot of the file.
+        :return: Line ranges of functions added or modified since the previous snapshot.
+        """
+        try:
+            functions = self.code_extractor.extract_functions(content)
+        except SyntaxError as e:
+            # files are often saved half-edited, keep the previous snapshot until they parse again
+            logger.debug('Skipping %s: %s', file_id, e)
+            return []
+        previous = self.files.get(file_id, {})
+        current = {}
+        changed = []
+        for func in functions:
+            key = f'{func.class_name or ""}.{func.name}'
+            # keep redefinitions of the same name apart
+            while key in current:
+                key += "'"
+            current[key] = self.code_extractor.content_hash(func.body)
+            if previous.get(key) != current[key]:
+                changed.append((func.start_line, func.end_line))
+        self.files[file_id] = current
+        return changed
+
+    def remove(self, file_id: str) -> None:
+        self.files.pop(file_id, None)
+
+
+@inject
+def watch(
+        source_folder: str,
+        target_folder: str,
+        settings: Settings = Provide[DIContainer.settings],
+        code_extractor: CodeExtractor = Provide[DIContainer.code_extractor],
+        storage: Storage = Provide[DIContainer.storage],
+        blob_store: BlobStore = Provide[DIContainer.blob_store],
+) -> None:
+    """
+    Watch the source folder and generate tests for functions added or modified by each burst of saves.
+    Only the changed files are re-extracted, their tests are merged with the existing ones.
+
+    :param source_folder: Folder relative to the storage folder in settings.
+    :param target_folder: Folder of generated tests relative to the storage folder in settings.
+    :param settings: Settings object provided by DI.
+    :param code_extractor: Code extractor provided by DI.
+    :param storage: Storage backend provided by DI, only the local storage can be watched.
+    :param blob_store: Blob store provided by DI, emptied after each run to keep memory flat.
+    """
+    if not isinstance(storage, LocalStorage):
+        raise ValueError(f'Watch mode requires the local storage, not {settings.storage.type.name}')
+    exclude = ScannerGraph.exclude_target_folder(source_folder, target_folder)
+    snapshot = FunctionSnapshot(code_extractor)
+    for file in list_files(folder=source_folder, exclude=exclude):
+        snapshot.update(file.id, file.content)
+    graph = GeneratorGraph().build()
+
+    watcher = create_watcher(storage.resolve(source_folder), settings, exclude=exclude, root_folder=storage.root)
+    logger.info('Watching %s (%s), %d files', source_folder, type(watcher).__name__, len(snapshot.files))
+    try:
+        for paths in watcher.changes(debounce=settings.watch.debounce):
+            started = time.perf_counter()
+            files = {}
+            changes = {}
+            for path in sorted(paths):
+                content = read_file(path, folder=source_folder)
+                if content is None:
+                    snapshot.remove(path)
+                    continue
+                ranges = snapshot.update(path, content)
+                if ranges:
+                    files[path] = FileMessage(id=path, content=content)
+                    changes[path] = ranges
+            if not files:
+                continue
+            logger.info('Changed %d functions in %s', sum(len(r) for r in changes.values()), ', '.join(files))
+            response = graph.invoke(
+                {
+                    'files': files,
+                    'source_folder': source_folder,
+                    'target_folder': target_folder,
+                    'changes': changes,
+                },
+                {'max_concurrency': settings.concurrency}
+            )
+            write_failure_report(list(response.get('failures', {}).values()))
+            # messages and trees of the finished run are not referenced anymore
+            blob_store.clear()
+            code_extractor.clear()
+            tests = list(response.get('tests', {}).values())
+            logger.info('Updated %s in %.1fs', ', '.join(tests) or 'no tests', time.perf_counter() - started)
+    except KeyboardInterrupt:
+        logger.info('Stopped watching %s', source_folder)
+    finally:
+        watcher.close()
+
+
+if __name__ == '__main__':
+    di = DIContainer()
+    di.wire(packages=[
+        'testgen',
+        'testgen.graph',
+        'testgen.tools',
+    ])
+    watch('src', 'test')
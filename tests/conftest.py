@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# the package is not installed, import it from the source folder
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'src'))
@@ -0,0 +1,152 @@
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_COMPLETION = '''```python
+import unittest
+
+
+class TestFunction(unittest.TestCase):
+    def test_function(self):
+        self.assertTrue(True)
+```'''
+
+
+class MockOpenAIServer:
+    """
+    Local OpenAI-compatible chat completions server answering every request with a canned completion.
+    It simulates model latency, so the transport can be tested and tuned offline.
+    """
+
+    def __init__(
+            self,
+            latency: float = 0.2,
+            completion: str = DEFAULT_COMPLETION,
+            host: str = '127.0.0.1',
+            port: int = 0,
+    ):
+        """
+        :param latency: Seconds before the first byte of the response.
+        :param completion: Content of the assistant message of every response.
+        :param host: Host to listen on.
+        :param port: Port to listen on, a free port by default.
+        """
+        self.latency = latency
+        self.completion = completion
+        self.requests = 0
+        self.connections = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self.handler())
+        self.server.daemon_threads = True
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}/v1'
+
+    def handler(self) -> type:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # keep connections alive, so clients can reuse them
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self) -> None:
+                super().setup()
+                with server.lock:
+                    server.connections += 1
+
+            def log_message(self, format: str, *args) -> None:
+                logger.debug(format, *args)
+
+            def do_POST(self) -> None:
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                with server.lock:
+                    server.requests += 1
+                if not self.path.endswith('/chat/completions'):
+                    self.send_json(404, {'error': {'message': f'Unknown path {self.path}'}})
+                    return
+                time.sleep(server.latency)
+                if body.get('stream'):
+                    self.stream(body)
+                else:
+                    self.send_json(200, server.completion_response(body))
+
+            def send_json(self, status: int, data: dict) -> None:
+                content = json.dumps(data).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def stream(self, body: dict) -> None:
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                response = server.completion_response(body)
+                for line in server.completion.splitlines(keepends=True):
+                    chunk = {
+                        'id': response['id'],
+                        'object': 'chat.completion.chunk',
+                        'created': response['created'],
+                        'model': response['model'],
+                        'choices': [{'index': 0, 'delta': {'role': 'assistant', 'content': line},
+                                     'finish_reason': None}],
+                    }
+                    self.write_chunk(f'data: {json.dumps(chunk)}\n\n')
+                self.write_chunk('data: [DONE]\n\n')
+                self.write_chunk('')
+
+            def write_chunk(self, data: str) -> None:
+                content = data.encode('utf-8')
+                self.wfile.write(f'{len(content):x}\r\n'.encode('ascii') + content + b'\r\n')
+                self.wfile.flush()
+
+        return Handler
+
+    def completion_response(self, body: dict) -> dict:
+        prompt_tokens = sum(len(str(m.get('content', '')).split()) for m in body.get('messages', []))
+        completion_tokens = len(self.completion.split())
+        return {
+            'id': f'chatcmpl-mock-{self.requests}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body.get('model', 'mock'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': self.completion},
+                'finish_reason': 'stop',
+            }],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens,
+            },
+        }
+
+    def start(self) -> 'MockOpenAIServer':
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        logger.info('Mock OpenAI server listening on %s', self.base_url)
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        if self.thread is not None:
+            self.thread.join()
+
+    def __enter__(self) -> 'MockOpenAIServer':
+        return self.start()
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
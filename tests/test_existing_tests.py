@@ -0,0 +1,50 @@
+import ast
+from types import SimpleNamespace
+
+import pytest
+
+existing_tests = pytest.importorskip('testgen.service.existing_tests')
+
+EXISTING = '''\
+import pytest
+
+from mod import f
+
+
+def test_f():
+    assert f(1) == 1
+'''
+
+
+def make_index() -> 'existing_tests.ExistingTestIndex':
+    index = existing_tests.ExistingTestIndex.__new__(existing_tests.ExistingTestIndex)
+    index.code_extractor = SimpleNamespace(parse=ast.parse)
+    return index
+
+
+def test_splice_keeps_top_level_statements_before_definitions():
+    new = '''\
+import pytest
+
+from mod import g
+
+pytestmark = pytest.mark.slow
+
+
+def test_g():
+    assert g(1) == 2
+'''
+    spliced = make_index().splice(EXISTING, new)
+
+    tree = ast.parse(spliced)
+    names = [getattr(n, 'name', None) or ast.unparse(n) for n in tree.body]
+    assert names.index('pytestmark = pytest.mark.slow') < names.index('test_f') < names.index('test_g')
+
+
+@pytest.mark.parametrize('new', [
+    'X = helper()\n\n\ndef helper():\n    return 1\n',
+    'f = None\n',
+])
+def test_splice_rejects_unsafe_statements(new):
+    with pytest.raises(ValueError):
+        make_index().splice(EXISTING, new)
@@ -0,0 +1,130 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+from mock_openai import MockOpenAIServer
+
+http = pytest.importorskip('testgen.service.http')
+
+LATENCY = 0.2
+
+
+def make_settings(**http_settings) -> SimpleNamespace:
+    defaults = {
+        'max_connections': 8,
+        'max_keepalive_connections': 8,
+        'keepalive_expiry': 60.0,
+        'http2': False,
+        'connect_timeout': 5.0,
+        'read_timeout': 30.0,
+        'write_timeout': 5.0,
+        'pool_timeout': 30.0,
+        'connect_retries': 0,
+    }
+    return SimpleNamespace(http=SimpleNamespace(**{**defaults, **http_settings}))
+
+
+def chat(client, server: MockOpenAIServer) -> dict:
+    response = client.post(f'{server.base_url}/chat/completions', json={
+        'model': 'mock',
+        'messages': [{'role': 'user', 'content': 'Write tests'}],
+    })
+    response.raise_for_status()
+    return response.json()
+
+
+@pytest.fixture
+def server():
+    with MockOpenAIServer(latency=LATENCY) as server:
+        yield server
+
+
+def test_sequential_requests_reuse_connection(server):
+    pool = http.HttpClientPool(make_settings())
+    for _ in range(5):
+        assert chat(pool.client, server)['choices'][0]['message']['content']
+    pool.close()
+
+    summary = pool.metrics.summary()
+    assert summary['requests'] == 5
+    assert summary['new_connections'] == 1
+    assert summary['connection_reuse'] == pytest.approx(4 / 5)
+    assert server.connections == 1
+
+
+def test_concurrent_requests_saturate_pool(server):
+    pool = http.HttpClientPool(make_settings(max_connections=2, max_keepalive_connections=2))
+    with ThreadPoolExecutor(max_workers=6) as executor:
+        list(executor.map(lambda _: chat(pool.client, server), range(6)))
+    pool.close()
+
+    summary = pool.metrics.summary()
+    assert summary['requests'] == 6
+    assert summary['saturated_requests'] >= 4
+    assert summary['max_in_flight'] == 6
+    assert server.connections <= 2
+    # requests queued behind busy connections wait for about a response each
+    assert summary['pool_wait']['max'] >= LATENCY * 0.9
+
+
+def test_time_to_first_byte_includes_model_latency(server):
+    pool = http.HttpClientPool(make_settings())
+    for _ in range(3):
+        chat(pool.client, server)
+    pool.close()
+
+    ttfb = pool.metrics.summary()['time_to_first_byte']
+    assert LATENCY * 0.9 <= ttfb['p50'] < LATENCY + 1.0
+    assert 'requests' in http.format_http_summary(pool.metrics.summary())
+
+
+def test_async_client_shares_metrics_and_closes(server):
+    pool = http.HttpClientPool(make_settings())
+
+    async def run():
+        await asyncio.gather(*[pool.async_client.post(
+            f'{server.base_url}/chat/completions', json={'messages': []}) for _ in range(4)])
+        client = pool.async_client
+        await pool.aclose()
+        return client
+
+    client = asyncio.run(run())
+    assert client.is_closed
+    summary = pool.metrics.summary()
+    assert summary['requests'] == 4
+    assert summary['new_connections'] == 4
+    assert len(summary['time_to_first_byte']) > 0
+
+
+def test_close_closes_both_clients(server):
+    pool = http.HttpClientPool(make_settings())
+    client, async_client = pool.client, pool.async_client
+    chat(client, server)
+    pool.close()
+    assert client.is_closed
+    assert async_client.is_closed
+
+
+def test_chat_model_calls_go_through_pool(server):
+    pytest.importorskip('langchain_openai')
+    from langchain_core.messages import HumanMessage
+
+    from testgen.llm import ChatModel
+
+    pool = http.HttpClientPool(make_settings())
+    settings = SimpleNamespace(
+        model=SimpleNamespace(
+            type=SimpleNamespace(name='openai'),
+            params={'model': 'mock', 'base_url': server.base_url, 'api_key': 'mock', 'max_retries': 0},
+        ),
+        rate_limit=SimpleNamespace(requests_per_minute=None),
+    )
+    client = ChatModel(settings, pool).client
+    for index in range(3):
+        assert 'unittest' in client.invoke([HumanMessage(content=f'Request {index}')]).content
+    pool.close()
+
+    assert pool.metrics.summary()['requests'] == 3
+    assert server.connections == 1
@@ -0,0 +1,24 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+runnables = pytest.importorskip('langchain_core.runnables')
+limiter_module = pytest.importorskip('testgen.service.limiter')
+
+
+def test_nested_batches_share_global_budget():
+    limiter = limiter_module.ModelLimiter(SimpleNamespace(concurrency=3))
+    call = limiter.limit_calls(runnables.RunnableLambda(lambda x: time.sleep(0.05) or x))
+
+    # parallel branches fanning out again, like merges or class methods of concurrent files
+    def branch(index):
+        return call.batch(list(range(index * 4, index * 4 + 4)), {'max_concurrency': 3})
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        results = list(executor.map(branch, range(3)))
+
+    assert results == [list(range(i * 4, i * 4 + 4)) for i in range(3)]
+    assert limiter.max_in_flight == 3
+    assert limiter.in_flight == 0
@@ -0,0 +1,40 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('langgraph')
+runnables = pytest.importorskip('langchain_core.runnables')
+processor = pytest.importorskip('testgen.graph.processor')
+
+
+def fake_pipeline(respond):
+    return SimpleNamespace(get_pipeline=lambda: runnables.RunnableLambda(respond))
+
+
+def make_graph() -> 'processor.ProcessorGraph':
+    graph = processor.ProcessorGraph.__new__(processor.ProcessorGraph)
+    graph.settings = SimpleNamespace(
+        concurrency=4,
+        compaction=SimpleNamespace(enabled=False),
+        class_suites=SimpleNamespace(methods_per_call=2),
+    )
+    graph.fixture_pipeline = fake_pipeline(lambda function: f'fixture_{function.name}')
+    graph.method_tests_pipeline = fake_pipeline(
+        lambda data: f"tests_{data['fixture']}_{'_'.join(data['methods'])}")
+    return graph
+
+
+def test_class_route_runs_through_graph():
+    function = SimpleNamespace(
+        id='mod.py::Account:1', name='Account', route='class', methods=['open', 'close', 'deposit'],
+        generated_code=None,
+    )
+
+    response = make_graph().build().invoke({'function': function})
+
+    generated = response['functions'][function.id].generated_code
+    assert generated.split('\n\n\n') == [
+        'fixture_Account',
+        'tests_fixture_Account_open_close',
+        'tests_fixture_Account_deposit',
+    ]
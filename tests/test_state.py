@@ -0,0 +1,50 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('langgraph')
+
+from testgen.graph.state import KeyedMessagesChannel, merge_by_id  # noqa: E402
+
+
+def message(index: int) -> SimpleNamespace:
+    return SimpleNamespace(id=str(index))
+
+
+def superstep_time(size: int) -> float:
+    """Best time of merging one message per branch of a `Send` fan-out of the size"""
+    best = float('inf')
+    for _ in range(3):
+        channel = KeyedMessagesChannel()
+        updates = [{str(i): message(i)} for i in range(size)]
+        start = time.perf_counter()
+        channel.update(updates)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def test_merge_by_id_adds_replaces_and_removes():
+    merged = merge_by_id({'1': message(1), '2': message(2)}, {'2': None, '3': message(3)})
+    assert sorted(merged) == ['1', '3']
+    merged = merge_by_id(merged, [message(4)])
+    assert sorted(merged) == ['1', '3', '4']
+
+
+def test_channel_does_not_mutate_previous_value():
+    channel = KeyedMessagesChannel()
+    channel.update([{'1': message(1)}])
+    previous = channel.get()
+    channel.update([{'2': message(2)}, {'1': None}])
+    assert sorted(previous) == ['1']
+    assert sorted(channel.get()) == ['2']
+
+
+def test_superstep_merge_cost_is_linear():
+    small, large = 1_000, 16_000
+    small_time = superstep_time(small)
+    large_time = superstep_time(large)
+    per_message_small = small_time / small
+    per_message_large = large_time / large
+    # quadratic merging, e.g. `add_messages`, is about 16 times slower per message at the large size
+    assert per_message_large < per_message_small * 4, (small_time, large_time)